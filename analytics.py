@@ -0,0 +1,313 @@
+# analytics.py
+#
+# Finished quiz sessions are kept for analysis instead of being dropped with the session:
+# answers and their tags, age bucket, hobbies and the recommended careers. Every write
+# also bumps the rollup tables (models.py, ANALYTICS section) with dialect upserts, so
+# the dashboard queries below read one row per day and bucket, however many sessions
+# there are. For offline work the sessions themselves export to Parquet:
+#
+#   python analytics.py export sessions.parquet --since 2026-10-01
+#
+# The export pages through the table and writes one row group per page, so memory stays
+# flat for millions of sessions.
+
+import argparse
+import datetime
+import json
+import os
+from collections import Counter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+import metrics, models
+from conversation import AGE_BUCKETS, age_bucket, normalize_hobbies, turn_tag
+from database import SessionLocal
+
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "1") == "1"
+# Window used by the dashboard endpoints when no dates are given.
+ANALYTICS_DEFAULT_DAYS = int(os.getenv("ANALYTICS_DEFAULT_DAYS", "30"))
+ANALYTICS_EXPORT_BATCH_SIZE = int(os.getenv("ANALYTICS_EXPORT_BATCH_SIZE", "50000"))
+# GET /analytics/export.parquet hands out every child's age, hobbies and answers, so it
+# is off unless this is set, and then needs "Authorization: Bearer <token>".
+ANALYTICS_EXPORT_TOKEN = os.getenv("ANALYTICS_EXPORT_TOKEN")
+
+AGE_BUCKET_LABELS = [label for _, label in AGE_BUCKETS] + ["18+"]
+
+# --- WRITES ---
+
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+def _insert(db, model):
+    dialect = db.get_bind().dialect.name
+    if dialect not in _INSERTS:
+        raise NotImplementedError(f"Analytics rollups need INSERT ... ON CONFLICT, which {dialect} does not support")
+    return _INSERTS[dialect](model)
+
+def _increment(db, model, keys, rows):
+    # INSERT ... ON CONFLICT (keys) DO UPDATE SET n = n + excluded.n. Rows go in key order
+    # so concurrent writers on Postgres lock them in the same order and can't deadlock.
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda row: tuple(row[key] for key in keys))
+    statement = _insert(db, model)
+    counters = [name for name in rows[0] if name not in keys]
+    statement = statement.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: getattr(model, name) + statement.excluded[name] for name in counters},
+    )
+    db.execute(statement, rows)
+
+def career_names(recommendations):
+    names = {}
+    for item in (recommendations or {}).get("recommendations", []):
+        name = " ".join(str(item.get("career") or "").split())
+        if name:
+            names.setdefault(name.lower(), name)
+    return list(names.values())
+
+def completed_session(state, mode, completed_at):
+    answers = [{"question": turn["question"], "answer": turn["answer"], "tag": turn_tag(turn)} for turn in state["history"]]
+    return {
+        "id": state["id"],
+        "completed_at": completed_at,
+        "age_bucket": age_bucket(state["user_age"]),
+        "user_age": state["user_age"],
+        "quiz_id": state["quiz_id"],
+        "mode": mode,
+        "hobbies": json.dumps(normalize_hobbies(state["hobbies"])),
+        "answers": json.dumps(answers),
+        "careers": json.dumps(career_names(state["recommendations"])),
+    }
+
+def rollup_rows(row):
+    day, bucket = row["completed_at"].date(), row["age_bucket"]
+    answers = json.loads(row["answers"])
+    tags = Counter(answer["tag"] for answer in answers if answer["tag"])
+    careers = json.loads(row["careers"])
+    return {
+        models.SessionDailyRollup: (["day", "age_bucket"], [{"day": day, "age_bucket": bucket, "sessions": 1, "answers": len(answers)}]),
+        models.TagDailyRollup: (["day", "age_bucket", "tag"], [
+            {"day": day, "age_bucket": bucket, "tag": tag, "answers": count, "sessions": 1} for tag, count in tags.items()
+        ]),
+        models.CareerDailyRollup: (["day", "age_bucket", "career"], [
+            {"day": day, "age_bucket": bucket, "career": career, "sessions": 1} for career in careers
+        ]),
+        models.CareerTagRollup: (["career", "tag"], [
+            {"career": career, "tag": tag, "sessions": 1, "answers": count} for career in careers for tag, count in tags.items()
+        ]),
+    }
+
+def record_session(state, mode=None):
+    # Called once a session has its recommendations. The session id makes it idempotent:
+    # a repeated call finds the row and leaves the rollups alone.
+    if not ANALYTICS_ENABLED:
+        return False
+    row = completed_session(state, mode, datetime.datetime.utcnow())
+    db = SessionLocal()
+    try:
+        inserted = db.execute(_insert(db, models.CompletedSession).values(**row).on_conflict_do_nothing(index_elements=["id"])).rowcount
+        if inserted:
+            for model, (keys, rows) in rollup_rows(row).items():
+                _increment(db, model, keys, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        metrics.analytics_sessions.inc(result="error")
+        raise
+    finally:
+        db.close()
+    metrics.analytics_sessions.inc(result="recorded" if inserted else "duplicate")
+    return bool(inserted)
+
+# --- DASHBOARD QUERIES ---
+
+def normalize_age_bucket(value):
+    # Accepts a bucket label ("9-11") or anything age_bucket() understands ("10", "grade 5").
+    if not value:
+        return None
+    return value if value in AGE_BUCKET_LABELS else age_bucket(value)
+
+def date_range(since=None, until=None):
+    until = until or datetime.datetime.utcnow().date()
+    since = since or until - datetime.timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    if since > until:
+        raise ValueError("since must not be after until")
+    return since, until
+
+def _window(model, bucket, since, until):
+    clauses = [model.day >= since, model.day <= until]
+    if bucket:
+        clauses.append(model.age_bucket == bucket)
+    return clauses
+
+def _share(part, whole):
+    return round(part / whole, 4) if whole else 0.0
+
+def summary(age_bucket=None, since=None, until=None, limit=10):
+    since, until = date_range(since, until)
+    bucket = normalize_age_bucket(age_bucket)
+    days_model, tags_model, careers_model = models.SessionDailyRollup, models.TagDailyRollup, models.CareerDailyRollup
+    db = SessionLocal()
+    try:
+        days = db.execute(
+            select(days_model.day, func.sum(days_model.sessions), func.sum(days_model.answers))
+            .where(*_window(days_model, bucket, since, until)).group_by(days_model.day).order_by(days_model.day)
+        ).all()
+        answers_total = func.sum(tags_model.answers)
+        tags = db.execute(
+            select(tags_model.tag, answers_total, func.sum(tags_model.sessions))
+            .where(*_window(tags_model, bucket, since, until)).group_by(tags_model.tag).order_by(answers_total.desc(), tags_model.tag)
+        ).all()
+        sessions_total = func.sum(careers_model.sessions)
+        careers = db.execute(
+            select(careers_model.career, sessions_total)
+            .where(*_window(careers_model, bucket, since, until)).group_by(careers_model.career)
+            .order_by(sessions_total.desc(), careers_model.career).limit(limit)
+        ).all()
+    finally:
+        db.close()
+    sessions = sum(row[1] for row in days)
+    answers = sum(row[2] for row in days)
+    return {
+        "age_bucket": bucket,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "sessions": sessions,
+        "answers": answers,
+        "days": [{"day": day.isoformat(), "sessions": count} for day, count, _ in days],
+        # share: of all answers for tags, of all sessions for careers.
+        "tags": [
+            {"tag": tag, "answers": count, "sessions": tag_sessions, "share": _share(count, answers)}
+            for tag, count, tag_sessions in tags
+        ],
+        "careers": [{"career": career, "sessions": count, "share": _share(count, sessions)} for career, count in careers],
+    }
+
+def career_tags(career=None, tag=None, limit=20):
+    # Either the tags behind one career or the careers recommended to one tag's fans.
+    model = models.CareerTagRollup
+    db = SessionLocal()
+    try:
+        if career is not None:
+            rows = db.execute(
+                select(model.tag, model.sessions, model.answers).where(model.career == career)
+                .order_by(model.answers.desc(), model.tag).limit(limit)
+            ).all()
+        else:
+            rows = db.execute(
+                select(model.career, model.sessions, model.answers).where(model.tag == tag)
+                .order_by(model.sessions.desc(), model.career).limit(limit)
+            ).all()
+    finally:
+        db.close()
+    answers = sum(row[2] for row in rows)
+    name = "tag" if career is not None else "career"
+    return {
+        "career": career,
+        "tag": tag,
+        "items": [{name: key, "sessions": sessions, "answers": count, "share": _share(count, answers)} for key, sessions, count in rows],
+    }
+
+# --- PARQUET EXPORT ---
+
+def iter_sessions(since=None, until=None, batch_size=ANALYTICS_EXPORT_BATCH_SIZE):
+    # Keyset pagination on (completed_at, id): each page is an index range scan, where
+    # OFFSET would rescan everything before it.
+    model = models.CompletedSession
+    clauses = []
+    if since:
+        clauses.append(model.completed_at >= datetime.datetime.combine(since, datetime.time.min))
+    if until:
+        clauses.append(model.completed_at < datetime.datetime.combine(until + datetime.timedelta(days=1), datetime.time.min))
+    last = None
+    while True:
+        query = select(model).where(*clauses).order_by(model.completed_at, model.id).limit(batch_size)
+        if last is not None:
+            query = query.where(tuple_(model.completed_at, model.id) > tuple_(*last))
+        db = SessionLocal()
+        try:
+            rows = db.scalars(query).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        yield rows
+        last = (rows[-1].completed_at, rows[-1].id)
+
+def parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("session_id", pa.string()),
+        ("completed_at", pa.timestamp("us")),
+        ("day", pa.date32()),
+        ("age_bucket", pa.string()),
+        ("user_age", pa.string()),
+        ("quiz_id", pa.int64()),
+        ("mode", pa.string()),
+        ("hobbies", pa.list_(pa.string())),
+        ("answers", pa.list_(pa.struct([("question", pa.string()), ("answer", pa.string()), ("tag", pa.string())]))),
+        ("tag_counts", pa.map_(pa.string(), pa.int32())),
+        ("careers", pa.list_(pa.string())),
+    ])
+
+def parquet_batch(rows, schema):
+    import pyarrow as pa
+
+    columns = {name: [] for name in schema.names}
+    for row in rows:
+        answers = json.loads(row.answers)
+        columns["session_id"].append(row.id)
+        columns["completed_at"].append(row.completed_at)
+        columns["day"].append(row.completed_at.date())
+        columns["age_bucket"].append(row.age_bucket)
+        columns["user_age"].append(row.user_age)
+        columns["quiz_id"].append(row.quiz_id)
+        columns["mode"].append(row.mode)
+        columns["hobbies"].append(json.loads(row.hobbies))
+        columns["answers"].append(answers)
+        columns["tag_counts"].append(list(Counter(answer["tag"] for answer in answers if answer["tag"]).items()))
+        columns["careers"].append(json.loads(row.careers))
+    return pa.Table.from_pydict(columns, schema=schema)
+
+def export_parquet(path, since=None, until=None, batch_size=ANALYTICS_EXPORT_BATCH_SIZE):
+    # pyarrow is only needed here, so the API workers don't import it at startup.
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+    exported = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for rows in iter_sessions(since, until, batch_size):
+            writer.write_table(parquet_batch(rows, schema))
+            exported += len(rows)
+    return exported
+
+# --- MAIN ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Session analytics.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write finished sessions to a Parquet file")
+    export.add_argument("path")
+    export.add_argument("--since", type=datetime.date.fromisoformat, help="first day, YYYY-MM-DD (UTC)")
+    export.add_argument("--until", type=datetime.date.fromisoformat, help="last day, YYYY-MM-DD (UTC)")
+    export.add_argument("--batch-size", type=int, default=ANALYTICS_EXPORT_BATCH_SIZE, help="sessions per row group")
+    report = commands.add_parser("summary", help="print the dashboard summary as JSON")
+    report.add_argument("--age-bucket")
+    report.add_argument("--since", type=datetime.date.fromisoformat)
+    report.add_argument("--until", type=datetime.date.fromisoformat)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        count = export_parquet(args.path, args.since, args.until, args.batch_size)
+        print(f"Exported {count} sessions to {args.path}.")
+    else:
+        print(json.dumps(summary(args.age_bucket, args.since, args.until), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@
 
 import streamlit as st
 import requests
-import json
+
+from backend_client import get_client, get_quiz
+from sse import iter_sse
 
 # --- Page Configuration & Title ---
 st.set_page_config(page_title="Project Zhero", page_icon="🚀", layout="centered")
@@ -10,6 +12,8 @@ st.title("Project Zhero 🚀")
 
 # --- Backend API URL ---
 BACKEND_URL = st.secrets.get("BACKEND_URL", "http://127.0.0.1:8000")
+QUIZ_ID = 1
+client = get_client(BACKEND_URL)
 
 # --- Initialize Session State ---
 if 'stage' not in st.session_state:
@@ -20,77 +24,90 @@ if 'hobbies' not in st.session_state:
     st.session_state.hobbies = ""
 if 'total_questions' not in st.session_state:
     st.session_state.total_questions = 5
-if 'static_quiz_data' not in st.session_state:
-    st.session_state.static_quiz_data = None
-if 'current_q_index' not in st.session_state:
-    st.session_state.current_q_index = 0
-if 'conversation_history' not in st.session_state:
-    st.session_state.conversation_history = []
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = None
+if 'question_number' not in st.session_state:
+    st.session_state.question_number = 1
 if 'current_question_obj' not in st.session_state:
     st.session_state.current_question_obj = {}
 if 'career_recommendations' not in st.session_state:
     st.session_state.career_recommendations = []
+if 'prefetched' not in st.session_state:
+    st.session_state.prefetched = None
 
 # --- Functions (Callbacks) ---
+# The backend keeps the transcript in a server-side session; each turn only sends the chosen answer.
+
+def apply_session_view(view):
+    st.session_state.session_id = view['session_id']
+    st.session_state.question_number = view['question_number']
+    if view['complete']:
+        st.session_state.stage = 'final_analysis'
+    else:
+        st.session_state.current_question_obj = view['question']
 
 def start_quiz():
     try:
-        response = requests.get(f"{BACKEND_URL}/quizzes/1")
-        response.raise_for_status()
-        st.session_state.static_quiz_data = response.json()['questions']
+        view = client.create_session(
+            st.session_state.user_age,
+            [h.strip() for h in st.session_state.hobbies.split(',') if h.strip()],
+            st.session_state.total_questions,
+        )
         st.session_state.stage = 'quiz'
-        st.session_state.current_q_index = 0
-        st.session_state.conversation_history = []
-        st.session_state.current_question_obj = st.session_state.static_quiz_data[0]
+        apply_session_view(view)
     except requests.exceptions.RequestException as e:
         st.error(f"Error connecting to the backend: {e}. Please ensure the backend is running and accessible.")
         st.session_state.stage = 'error'
 
-def handle_answer(question_text, answer_text):
-    st.session_state.conversation_history.append({"question": question_text, "answer": answer_text})
-    
-    current_question_number = st.session_state.current_q_index + 1
-    
-    if current_question_number < len(st.session_state.static_quiz_data):
-        st.session_state.current_q_index += 1
-        st.session_state.current_question_obj = st.session_state.static_quiz_data[st.session_state.current_q_index]
-    elif current_question_number < st.session_state.total_questions:
-        with st.spinner("Your personal AI counselor is thinking..."):
-            try:
-                request_body = {
-                    "conversation_history": st.session_state.conversation_history,
-                    "user_age": st.session_state.user_age,
-                    "hobbies": [h.strip() for h in st.session_state.hobbies.split(',') if h.strip()]
-                }
-                response = requests.post(f"{BACKEND_URL}/generate-conversational-question", json=request_body)
-                response.raise_for_status()
-                st.session_state.current_question_obj = response.json()
-                st.session_state.current_q_index += 1
-            except requests.exceptions.RequestException as e:
-                st.error(f"Error generating AI question: {e}")
-                st.session_state.stage = 'error'
-    else:
-        st.session_state.stage = 'final_analysis'
-
-def run_final_analysis_and_get_recs():
-    with st.spinner("Analyzing your conversation and generating recommendations..."):
+def handle_answer(choice_index):
+    # The backend has usually prefetched the next question by now (unless it is busy or
+    # runs with PREFETCH_ENABLED=0), so this returns before the spinner's display delay.
+    with st.spinner("Your personal AI counselor is thinking..."):
         try:
-            request_body = {
-                "conversation_history": st.session_state.conversation_history,
-                "user_age": st.session_state.user_age,
-                "hobbies": [h.strip() for h in st.session_state.hobbies.split(',') if h.strip()]
-            }
-            response = requests.post(f"{BACKEND_URL}/generate-ai-recommendations", json=request_body)
-            response.raise_for_status()
-            st.session_state.career_recommendations = response.json().get('recommendations', [])
-            st.session_state.stage = 'show_recommendations'
+            apply_session_view(client.answer(st.session_state.session_id, choice_index))
         except requests.exceptions.RequestException as e:
-            st.error(f"Error getting AI recommendations: {e}")
-            st.session_state.stage = 'final_analysis'
+            # The session only advances on success, so the same question stays answerable.
+            st.error(f"Error generating AI question: {e}. Please pick your answer again.")
+
+def start_final_analysis():
+    st.session_state.stage = 'analyzing'
+
+def render_recommendation(career):
+    with st.container(border=True):
+        st.subheader(career.get('career', 'N/A'))
+        st.markdown(f"**Why it's a good fit for you:** {career.get('reason', 'No reason provided.')}")
+
+def run_final_analysis_and_get_recs():
+    # Streams the recommendations and renders each card as soon as the backend emits it.
+    st.info("Analyzing your conversation and generating recommendations...")
+    recommendations = []
+    try:
+        with client.stream_recommendations(st.session_state.session_id) as response:
+            for event, data in iter_sse(response):
+                if event == 'recommendation':
+                    recommendations.append(data)
+                    render_recommendation(data)
+                elif event == 'done':
+                    recommendations = data.get('recommendations', recommendations)
+                elif event == 'error':
+                    raise requests.exceptions.RequestException(data.get('detail'))
+        st.session_state.career_recommendations = recommendations
+        st.session_state.stage = 'show_recommendations'
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error getting AI recommendations: {e}")
+        st.session_state.stage = 'final_analysis'
+        st.button("Try Again", on_click=start_final_analysis)
+        return
+    st.rerun()
 
 # --- UI Rendering ---
 
 if st.session_state.stage == 'setup':
+    try:
+        quiz = get_quiz(BACKEND_URL, QUIZ_ID)
+        st.caption(f"{quiz['title']}: {quiz['description']}")
+    except requests.exceptions.RequestException:
+        pass
     st.subheader("First, let's personalize your session.")
     st.session_state.user_age = st.text_input("What is your age or grade level?", placeholder="e.g., 10 years old")
     st.session_state.hobbies = st.text_input("List a few hobbies or interests (optional)", placeholder="e.g., video games, painting")
@@ -98,31 +115,34 @@ if st.session_state.stage == 'setup':
     st.button("Start Analysis", on_click=start_quiz)
 
 elif st.session_state.stage == 'quiz':
-    question_num = st.session_state.current_q_index + 1
+    question_num = st.session_state.question_number
     total_q = st.session_state.total_questions
     st.progress((question_num - 1) / total_q, text=f"Question {question_num} of {total_q}")
     question_text = st.session_state.current_question_obj.get('question', st.session_state.current_question_obj.get('text', ''))
     st.subheader(question_text)
     st.write("---")
     for i, choice in enumerate(st.session_state.current_question_obj['choices']):
-        answer_text = choice.get('text', '')
-        if 'tag' in choice:
-            answer_text = f"{choice['text']} ({choice['tag']})"
-        st.button(choice['text'], key=i, on_click=handle_answer, args=(question_text, answer_text))
+        st.button(choice['text'], key=i, on_click=handle_answer, args=(i,))
+    # Once per question, not on every rerun.
+    current = (st.session_state.session_id, question_num)
+    if st.session_state.prefetched != current:
+        st.session_state.prefetched = current
+        client.prefetch(st.session_state.session_id)
 
 elif st.session_state.stage == 'final_analysis':
     st.success("Analysis Complete!")
     st.info("Based on your conversation, we're now ready to discover your personalized career recommendations.")
-    st.button("Show My AI Recommendations", on_click=run_final_analysis_and_get_recs)
+    st.button("Show My AI Recommendations", on_click=start_final_analysis)
+
+elif st.session_state.stage == 'analyzing':
+    run_final_analysis_and_get_recs()
 
 elif st.session_state.stage == 'show_recommendations':
     st.success("Here are your personalized AI-generated recommendations!")
     st.write("---")
     if st.session_state.career_recommendations:
         for career in st.session_state.career_recommendations:
-            with st.container(border=True):
-                st.subheader(career.get('career', 'N/A'))
-                st.markdown(f"**Why it's a good fit for you:** {career.get('reason', 'No reason provided.')}")
+            render_recommendation(career)
     else:
         st.warning("The AI could not generate specific career recommendations. Try a 'Deep Dive' quiz for more accuracy!")
     st.write("---")
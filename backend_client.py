@@ -0,0 +1,100 @@
+# backend_client.py
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# One keep-alive connection pool per Streamlit server process, shared by every browser
+# session and rerun, so a click no longer pays a new TCP + TLS handshake.
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "10"))
+BACKEND_CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "3.05"))
+BACKEND_READ_TIMEOUT = float(os.getenv("BACKEND_READ_TIMEOUT", "60"))
+# Streams can go quiet while the model writes a long recommendation.
+BACKEND_STREAM_READ_TIMEOUT = float(os.getenv("BACKEND_STREAM_READ_TIMEOUT", "120"))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", "3"))
+FRONTEND_QUIZ_CACHE_SECONDS = float(os.getenv("FRONTEND_QUIZ_CACHE_SECONDS", "300"))
+
+def _retry():
+    # Connection failures are retried for every method: the request never reached the
+    # backend. Error statuses (a deploy, a 503 with Retry-After) only for GETs, because
+    # POST /sessions would create a second session.
+    return Retry(
+        total=BACKEND_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+class BackendClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BACKEND_POOL_SIZE, max_retries=_retry())
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        self.timeout = (BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT)
+        self._quizzes = {}
+        self._lock = threading.Lock()
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="backend-prefetch")
+
+    def _post(self, path, payload=None):
+        response = self.http.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get_quiz(self, quiz_id):
+        # Revalidates with the last ETag; a 304 reuses the body we already have.
+        with self._lock:
+            etag, quiz = self._quizzes.get(quiz_id, (None, None))
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self.http.get(f"{self.base_url}/quizzes/{quiz_id}", headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and quiz is not None:
+            return quiz
+        response.raise_for_status()
+        quiz = response.json()
+        if response.headers.get("ETag"):
+            with self._lock:
+                self._quizzes[quiz_id] = (response.headers["ETag"], quiz)
+        return quiz
+
+    def create_session(self, user_age, hobbies, total_questions):
+        return self._post("/sessions", {"user_age": user_age, "hobbies": hobbies, "total_questions": total_questions})
+
+    def answer(self, session_id, choice_index):
+        return self._post(f"/sessions/{session_id}/answers", {"choice_index": choice_index})
+
+    def prefetch(self, session_id):
+        # Fire and forget: asks the backend to start on the next question while the user
+        # reads this one. A failure only means the answer takes as long as it used to.
+        def send():
+            try:
+                self._post(f"/sessions/{session_id}/prefetch")
+            except requests.exceptions.RequestException:
+                pass
+        self._background.submit(send)
+
+    def stream_recommendations(self, session_id):
+        # Use as a context manager; iterate with sse.iter_sse().
+        url = f"{self.base_url}/sessions/{session_id}/recommendations/stream"
+        response = self.http.get(url, stream=True, timeout=(BACKEND_CONNECT_TIMEOUT, BACKEND_STREAM_READ_TIMEOUT))
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+        return response
+
+@st.cache_resource
+def get_client(base_url):
+    return BackendClient(base_url)
+
+@st.cache_data(ttl=FRONTEND_QUIZ_CACHE_SECONDS, show_spinner=False)
+def get_quiz(base_url, quiz_id):
+    # Across reruns and sessions the quiz comes from here; once the TTL is up the next
+    # call revalidates with If-None-Match instead of downloading it again.
+    return get_client(base_url).get_quiz(quiz_id)
@@ -0,0 +1,295 @@
+# batch.py
+
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import traceback
+import uuid
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+
+import models, schemas
+from database import SessionLocal
+from llm import LLM_MAX_CONCURRENCY
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+# Batch items share llm.py's slots and queue with live users. At most this many are
+# generating at once across all jobs, so the rest of LLM_MAX_CONCURRENCY stays free
+# for interactive requests; keep it below LLM_MAX_CONCURRENCY.
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", str(max(1, LLM_MAX_CONCURRENCY // 2))))
+# Completed items are written back in groups of this size; a crash repeats at most one group.
+BATCH_FLUSH_SIZE = int(os.getenv("BATCH_FLUSH_SIZE", "50"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+# A running job renews its claim this often; a claim older than BATCH_LEASE_SECONDS
+# belongs to a worker that died, and the job may be resumed elsewhere.
+BATCH_LEASE_SECONDS = float(os.getenv("BATCH_LEASE_SECONDS", "60"))
+BATCH_HEARTBEAT_SECONDS = BATCH_LEASE_SECONDS / 3
+
+# Item statuses: pending -> done | error. Records that fail validation are stored as
+# "invalid" and never retried; "error" items are retried when the job is resumed.
+RETRYABLE_STATUSES = ("pending", "error")
+
+# --- INPUT ---
+
+def parse_items(body, content_type):
+    if "ndjson" in (content_type or "") or "jsonlines" in (content_type or ""):
+        records = []
+        for line in body.decode("utf-8").splitlines():
+            if line.strip():
+                try:
+                    records.append(json.loads(line))
+                except ValueError as e:
+                    records.append({"_raw": line, "_error": f"Invalid JSON: {e}"})
+    else:
+        records = json.loads(body)
+        if isinstance(records, dict):
+            records = records.get("items", [])
+        if not isinstance(records, list):
+            raise ValueError("Expected a JSON list of items, {\"items\": [...]}, or an NDJSON upload")
+    if len(records) > BATCH_MAX_ITEMS:
+        raise ValueError(f"A batch may contain at most {BATCH_MAX_ITEMS} items")
+
+    items = []
+    for record in records:
+        if isinstance(record, dict) and "_error" in record:
+            items.append((record, record["_error"]))
+            continue
+        try:
+            items.append((schemas.ConversationalInput.model_validate(record).model_dump(), None))
+        except ValidationError as e:
+            items.append((record, str(e)))
+    return items
+
+def input_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+# --- PERSISTENCE ---
+
+def create_job(items, mode):
+    job_id = uuid.uuid4().hex
+    now = datetime.datetime.utcnow()
+    rows = [
+        {
+            "job_id": job_id,
+            "position": position,
+            "input_hash": input_hash(payload),
+            "input": json.dumps(payload),
+            "status": "invalid" if error else "pending",
+            "error": error,
+        }
+        for position, (payload, error) in enumerate(items)
+    ]
+    db = SessionLocal()
+    try:
+        db.add(models.BatchJob(id=job_id, mode=mode, total=len(rows), status="queued", created_at=now, updated_at=now))
+        db.flush()
+        if rows:
+            db.execute(insert(models.BatchItem), rows)
+        db.commit()
+    finally:
+        db.close()
+    return job_id
+
+def job_status(job_id):
+    db = SessionLocal()
+    try:
+        job = db.get(models.BatchJob, job_id)
+        if job is None:
+            return None
+        counts = dict(
+            db.execute(
+                select(models.BatchItem.status, func.count())
+                .where(models.BatchItem.job_id == job_id)
+                .group_by(models.BatchItem.status)
+            ).all()
+        )
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "mode": job.mode,
+            "total": job.total,
+            "counts": counts,
+            "created_at": job.created_at.isoformat(),
+            "updated_at": job.updated_at.isoformat(),
+            # In any worker: running jobs renew updated_at every BATCH_HEARTBEAT_SECONDS.
+            "running": job.status == "running" and not _lease_expired(job.updated_at),
+        }
+    finally:
+        db.close()
+
+def _lease_expired(updated_at):
+    return (datetime.datetime.utcnow() - updated_at).total_seconds() > BATCH_LEASE_SECONDS
+
+def claim_job(job_id):
+    # Conditional UPDATE, so of several workers asked to run the same job exactly one
+    # wins, whichever worker the request landed on.
+    now = datetime.datetime.utcnow()
+    stale = now - datetime.timedelta(seconds=BATCH_LEASE_SECONDS)
+    db = SessionLocal()
+    try:
+        claimed = db.execute(
+            update(models.BatchJob)
+            .where(models.BatchJob.id == job_id)
+            .where((models.BatchJob.status != "running") | (models.BatchJob.updated_at < stale))
+            .values(status="running", updated_at=now)
+        ).rowcount
+        db.commit()
+    finally:
+        db.close()
+    return claimed == 1
+
+def _load_work(job_id):
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(models.BatchItem.position, models.BatchItem.input, models.BatchItem.input_hash, models.BatchItem.status, models.BatchItem.result)
+            .where(models.BatchItem.job_id == job_id)
+            .where(models.BatchItem.status.in_(("done",) + RETRYABLE_STATUSES))
+            .order_by(models.BatchItem.position)
+        ).all()
+    finally:
+        db.close()
+    known = {digest: json.loads(result) for _, _, digest, status, result in rows if status == "done"}
+    pending = [(position, json.loads(payload), digest) for position, payload, digest, status, _ in rows if status in RETRYABLE_STATUSES]
+    return pending, known
+
+def _save_results(job_id, results, status=None):
+    db = SessionLocal()
+    try:
+        if results:
+            db.execute(update(models.BatchItem), results)
+        values = {"updated_at": datetime.datetime.utcnow()}
+        if status:
+            values["status"] = status
+        db.execute(update(models.BatchJob).where(models.BatchJob.id == job_id).values(**values))
+        db.commit()
+    finally:
+        db.close()
+
+def iter_results(job_id, page_size=500):
+    position = -1
+    while True:
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(models.BatchItem.position, models.BatchItem.status, models.BatchItem.result, models.BatchItem.error)
+                .where(models.BatchItem.job_id == job_id, models.BatchItem.position > position)
+                .order_by(models.BatchItem.position)
+                .limit(page_size)
+            ).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+        for position, status, result, error in rows:
+            yield result_line(position, status, json.loads(result) if result else None, error)
+
+def result_line(position, status, result=None, error=None):
+    line = {"index": position, "status": status}
+    if result is not None:
+        line["result"] = result
+    if error:
+        line["error"] = error
+    return json.dumps(line) + "\n"
+
+# --- RUNNER ---
+
+class BatchRunner:
+    def __init__(self):
+        self._running = {}
+        self._listeners = {}
+        self._llm_slots = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+    async def start(self, job_id, recommend):
+        if job_id in self._running or not await asyncio.to_thread(claim_job, job_id):
+            return False
+        self._listeners[job_id] = []
+        self._running[job_id] = asyncio.create_task(self._run(job_id, recommend))
+        return True
+
+    def subscribe(self, job_id):
+        queue = asyncio.Queue()
+        self._listeners.setdefault(job_id, []).append(queue)
+        return queue
+
+    def _publish(self, job_id, line):
+        for queue in self._listeners.get(job_id, []):
+            queue.put_nowait(line)
+
+    async def _generate(self, recommend, payload):
+        async with self._llm_slots:
+            return await recommend(schemas.ConversationalInput(**payload))
+
+    async def _run(self, job_id, recommend):
+        buffer = []
+        status = "failed"
+
+        async def flush(job_status=None):
+            nonlocal buffer
+            results, buffer = buffer, []
+            await asyncio.to_thread(_save_results, job_id, results, job_status)
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(BATCH_HEARTBEAT_SECONDS)
+                await asyncio.to_thread(_save_results, job_id, [])
+
+        renew = asyncio.create_task(heartbeat())
+        try:
+            pending, known = await asyncio.to_thread(_load_work, job_id)
+            work = asyncio.Queue()
+            for item in pending:
+                work.put_nowait(item)
+            # Identical transcripts share one upstream call.
+            inflight = {}
+
+            async def worker():
+                while not work.empty():
+                    position, payload, digest = work.get_nowait()
+                    try:
+                        if digest in known:
+                            result = known[digest]
+                        else:
+                            if digest not in inflight:
+                                inflight[digest] = asyncio.ensure_future(self._generate(recommend, payload))
+                            result = await inflight[digest]
+                            known[digest] = result
+                        buffer.append({"job_id": job_id, "position": position, "status": "done", "result": json.dumps(result), "error": None})
+                        self._publish(job_id, result_line(position, "done", result))
+                    except Exception as e:
+                        detail = getattr(e, "detail", None) or str(e) or repr(e)
+                        buffer.append({"job_id": job_id, "position": position, "status": "error", "result": None, "error": detail})
+                        self._publish(job_id, result_line(position, "error", error=detail))
+                    if len(buffer) >= BATCH_FLUSH_SIZE:
+                        await flush()
+
+            await asyncio.gather(*(worker() for _ in range(min(BATCH_CONCURRENCY, len(pending)) or 1)))
+            status = "completed"
+        except asyncio.CancelledError:
+            status = "interrupted"
+            raise
+        except Exception:
+            traceback.print_exc()
+        finally:
+            renew.cancel()
+            try:
+                await asyncio.shield(flush(status))
+            finally:
+                self._running.pop(job_id, None)
+                for queue in self._listeners.pop(job_id, []):
+                    queue.put_nowait(None)
+
+async def stream_job(queue, initial=()):
+    # Yields NDJSON lines in completion order until the job finishes.
+    for line in initial:
+        yield line
+    while True:
+        line = await queue.get()
+        if line is None:
+            return
+        yield line
+
+batch_runner = BatchRunner()
@@ -4,6 +4,8 @@ import os
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+from llm_router import ROUTE_DEFAULTS, route_config
+
 # This setup is the same as in our main.py
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -17,13 +19,23 @@ else:
     print("Attempting to list available models...\n")
 
     try:
+        available = set()
         # This loop will go through all available models
         for m in genai.list_models():
             # We check if the model supports the 'generateContent' method we need
             if 'generateContent' in m.supported_generation_methods:
+                available.add(m.name.removeprefix("models/"))
                 print(f"Model Name: {m.name}")
                 print("-" * 20)
 
+        # The models main.py will route to (LLM_<TASK>_MODELS), primary first.
+        print("\nConfigured routes:")
+        for task in ROUTE_DEFAULTS:
+            config = route_config(task)
+            print(f"{task} (budget {config['budget']:g}s, p95 limit {config['p95']:g}s):")
+            for name in config["models"]:
+                print(f"  {name}: {'available' if name in available else 'NOT AVAILABLE'}")
+
     except Exception as e:
         print("An error occurred while trying to list the models:")
         print(e)
\ No newline at end of file
@@ -0,0 +1,176 @@
+# content_loader.py
+
+import hashlib
+import json
+import os
+
+import yaml
+from sqlalchemy import delete, insert, select, update
+
+import models
+from quiz_cache import bump_content_version
+
+CONTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "content")
+DEFAULT_CONTENT_FILES = [os.path.join(CONTENT_DIR, "default.yaml")]
+
+# --- READING ---
+
+def read_content_file(path):
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return yaml.safe_load(f) or {}
+
+def read_content(paths):
+    content = {"tags": [], "quizzes": [], "careers": []}
+    for path in paths:
+        document = read_content_file(path)
+        for section in content:
+            content[section].extend(document.get(section) or [])
+    return content
+
+def content_hash(entry):
+    return hashlib.sha256(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest()
+
+# --- LOADING ---
+# Everything happens in the caller's transaction: tags, quizzes and careers are
+# resolved to ids in memory and written with one executemany per table, using
+# INSERT ... RETURNING to get the new ids back in parameter order.
+
+def _ensure_tags(db, names):
+    existing = dict(db.execute(select(models.InterestTag.name, models.InterestTag.id)).all())
+    missing = [name for name in dict.fromkeys(names) if name not in existing]
+    if missing:
+        ids = db.scalars(
+            insert(models.InterestTag).returning(models.InterestTag.id, sort_by_parameter_order=True),
+            [{"name": name} for name in missing],
+        ).all()
+        existing.update(zip(missing, ids))
+    return existing, len(missing)
+
+def _existing_hashes(db, kind):
+    return dict(db.execute(select(models.ContentHash.key, models.ContentHash.hash).where(models.ContentHash.kind == kind)).all())
+
+def _record_hashes(db, kind, hashes):
+    if not hashes:
+        return
+    db.execute(delete(models.ContentHash).where(models.ContentHash.kind == kind, models.ContentHash.key.in_(list(hashes))))
+    db.execute(insert(models.ContentHash), [{"kind": kind, "key": key, "hash": value} for key, value in hashes.items()])
+
+def _load_quizzes(db, quizzes, tag_ids):
+    stats = {"added": 0, "updated": 0, "unchanged": 0}
+    known = _existing_hashes(db, "quiz")
+    quiz_ids = dict(db.execute(select(models.Quiz.title, models.Quiz.id)).all())
+    changed = {}
+    for quiz in quizzes:
+        digest = content_hash(quiz)
+        title = quiz["title"]
+        if title in quiz_ids and known.get(title) == digest:
+            stats["unchanged"] += 1
+            continue
+        if title in quiz_ids:
+            quiz_id = quiz_ids[title]
+            old_questions = select(models.Question.id).where(models.Question.quiz_id == quiz_id)
+            old_choices = select(models.Choice.id).where(models.Choice.question_id.in_(old_questions))
+            db.execute(delete(models.choice_interest_tag_association).where(
+                models.choice_interest_tag_association.c.choice_id.in_(old_choices)
+            ))
+            db.execute(delete(models.Choice).where(models.Choice.question_id.in_(old_questions)))
+            db.execute(delete(models.Question).where(models.Question.quiz_id == quiz_id))
+            db.execute(update(models.Quiz).where(models.Quiz.id == quiz_id).values(description=quiz.get("description", "")))
+            stats["updated"] += 1
+        else:
+            quiz_id = db.scalar(insert(models.Quiz).values(title=title, description=quiz.get("description", "")).returning(models.Quiz.id))
+            quiz_ids[title] = quiz_id
+            stats["added"] += 1
+        changed[title] = (quiz_id, quiz, digest)
+
+    # Questions, choices and choice tags for every changed quiz: one executemany each.
+    questions = [(quiz_id, question) for quiz_id, quiz, _ in changed.values() for question in quiz.get("questions", [])]
+    if questions:
+        question_ids = db.scalars(
+            insert(models.Question).returning(models.Question.id, sort_by_parameter_order=True),
+            [{"quiz_id": quiz_id, "text": question["text"]} for quiz_id, question in questions],
+        ).all()
+        choices = [
+            (question_id, choice)
+            for question_id, (_, question) in zip(question_ids, questions)
+            for choice in question.get("choices", [])
+        ]
+        if choices:
+            choice_ids = db.scalars(
+                insert(models.Choice).returning(models.Choice.id, sort_by_parameter_order=True),
+                [{"question_id": question_id, "text": choice["text"]} for question_id, choice in choices],
+            ).all()
+            links = [
+                {"choice_id": choice_id, "interest_tag_id": tag_ids[tag]}
+                for choice_id, (_, choice) in zip(choice_ids, choices)
+                for tag in choice.get("tags", [])
+            ]
+            if links:
+                db.execute(insert(models.choice_interest_tag_association), links)
+    _record_hashes(db, "quiz", {title: digest for title, (_, _, digest) in changed.items()})
+    return stats
+
+def _load_careers(db, careers, tag_ids):
+    stats = {"added": 0, "updated": 0, "unchanged": 0}
+    known = _existing_hashes(db, "career")
+    career_ids = dict(db.execute(select(models.Career.title, models.Career.id)).all())
+    changed, new = {}, []
+    for career in careers:
+        digest = content_hash(career)
+        title = career["title"]
+        if title in career_ids and known.get(title) == digest:
+            stats["unchanged"] += 1
+            continue
+        if title in career_ids:
+            db.execute(update(models.Career).where(models.Career.id == career_ids[title]).values(description=career.get("description", "")))
+            stats["updated"] += 1
+        else:
+            new.append(career)
+            stats["added"] += 1
+        changed[title] = (career, digest)
+
+    if new:
+        ids = db.scalars(
+            insert(models.Career).returning(models.Career.id, sort_by_parameter_order=True),
+            [{"title": career["title"], "description": career.get("description", "")} for career in new],
+        ).all()
+        career_ids.update(zip((career["title"] for career in new), ids))
+    if changed:
+        association = models.career_interest_tag_association
+        db.execute(delete(association).where(association.c.career_id.in_([career_ids[title] for title in changed])))
+        links = [
+            {"career_id": career_ids[title], "interest_tag_id": tag_ids[tag]}
+            for title, (career, _) in changed.items()
+            for tag in career.get("tags", [])
+        ]
+        if links:
+            db.execute(insert(association), links)
+    _record_hashes(db, "career", {title: digest for title, (_, digest) in changed.items()})
+    return stats
+
+def load_content(db, paths=None):
+    content = read_content(paths or DEFAULT_CONTENT_FILES)
+    referenced = list(content["tags"])
+    for quiz in content["quizzes"]:
+        for question in quiz.get("questions", []):
+            for choice in question.get("choices", []):
+                referenced.extend(choice.get("tags", []))
+    for career in content["careers"]:
+        referenced.extend(career.get("tags", []))
+
+    tag_ids, tags_added = _ensure_tags(db, referenced)
+    summary = {
+        "tags_added": tags_added,
+        "quizzes": _load_quizzes(db, content["quizzes"], tag_ids),
+        "careers": _load_careers(db, content["careers"], tag_ids),
+    }
+    summary["changed"] = bool(
+        tags_added
+        or summary["quizzes"]["added"] or summary["quizzes"]["updated"]
+        or summary["careers"]["added"] or summary["careers"]["updated"]
+    )
+    if summary["changed"]:
+        bump_content_version(db)
+    return summary
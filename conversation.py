@@ -0,0 +1,77 @@
+# conversation.py
+
+import re
+from collections import Counter
+
+ALLOWED_TAGS = [
+    "Analytical & Investigative",
+    "Artistic & Creative",
+    "Social & Helping",
+    "Enterprising & Leading",
+    "Conventional & Organizing",
+    "Realistic & Hands-On",
+]
+
+_TAG_SUFFIX = re.compile(r"\(([^()]*)\)\s*$")
+_FIRST_NUMBER = re.compile(r"\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+AGE_BUCKETS = [(8, "<=8"), (11, "9-11"), (14, "12-14"), (17, "15-17")]
+
+def age_bucket(user_age):
+    text = (user_age or "").strip().lower()
+    match = _FIRST_NUMBER.search(text)
+    if not match:
+        return _WHITESPACE.sub(" ", text) or "unknown"
+    age = int(match.group())
+    # "grade 5" / "5th grade" -> roughly 10 years old
+    if "grade" in text or "class" in text:
+        age += 5
+    for upper, label in AGE_BUCKETS:
+        if age <= upper:
+            return label
+    return "18+"
+
+def normalize_hobbies(hobbies):
+    return sorted({_WHITESPACE.sub(" ", h.strip().lower()) for h in hobbies if h and h.strip()})
+
+def choice_tag(choice):
+    # AI-generated choices carry "tag"; stored choices carry "interest_tags".
+    if choice.get("tag"):
+        return choice["tag"]
+    interest_tags = choice.get("interest_tags") or []
+    return interest_tags[0]["name"] if interest_tags else None
+
+def answer_turn(question_text, choice):
+    # The transcript entry for picking `choice`, in the form the prompts and cache keys expect.
+    tag = choice_tag(choice)
+    answer = f"{choice['text']} ({choice['tag']})" if choice.get("tag") else choice["text"]
+    turn = {"question": question_text, "answer": answer}
+    if tag:
+        turn["tag"] = tag
+    return turn
+
+def turn_tag(turn):
+    tag = turn.get("tag")
+    if tag in ALLOWED_TAGS:
+        return tag
+    # AI-generated choices are sent back as "answer text (Tag)".
+    match = _TAG_SUFFIX.search(turn.get("answer", ""))
+    if match and match.group(1).strip() in ALLOWED_TAGS:
+        return match.group(1).strip()
+    return None
+
+def turn_key(turn):
+    # Untagged answers come from a closed set of stored choices, so their
+    # normalized text is as good a key as a tag.
+    return turn_tag(turn) or _WHITESPACE.sub(" ", turn.get("answer", "").strip().lower())
+
+def tag_tally(history):
+    return Counter(tag for tag in map(turn_tag, history) if tag)
+
+def normalized_state(convo_input):
+    return {
+        "age": age_bucket(convo_input.user_age),
+        "hobbies": normalize_hobbies(convo_input.hobbies),
+        "history": [turn_key(turn) for turn in convo_input.conversation_history],
+    }
@@ -1,10 +1,23 @@
 # database.py (Corrected Supabase Version)
+import contextvars
+import logging
 import os
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Without a DATABASE_URL we run against a local SQLite file in WAL mode, which is
+# what dev setups and benchmarks use. serve.py refuses to start that way; set
+# DATABASE_URL=sqlite:///./zhero.db to run on SQLite on purpose.
+if not os.getenv("DATABASE_URL"):
+    logging.getLogger("zhero.db").warning(
+        "DATABASE_URL is not set: using the local SQLite file ./zhero.db. Data lives on this "
+        "machine's disk only; set DATABASE_URL for any shared or production deployment."
+    )
+DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite:///./zhero.db"
 
 # Supabase gives a 'postgresql://' URL, but SQLAlchemy works best if we
 # tell it explicitly to use the 'psycopg2' driver. We can do this by
@@ -12,7 +25,63 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL and DATABASE_URL.startswith("postgresql://"):
     DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://", 1)
 
-engine = create_engine(DATABASE_URL)
+# --- POOL SETTINGS ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Recycle before Supabase / PgBouncer drop idle server connections.
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Set when connecting through a transaction-mode pooler (Supabase port 6543 / PgBouncer):
+# the pooler already pools.
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+def _engine_kwargs():
+    if IS_SQLITE:
+        return {"connect_args": {"check_same_thread": False}}
+    if DB_PGBOUNCER:
+        return {"poolclass": NullPool, "pool_pre_ping": DB_POOL_PRE_PING}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _enable_sqlite_wal)
+
+# --- PER-REQUEST QUERY STATS ---
+# The API middleware sets a fresh dict per request; the cursor hooks below add to it.
+# asyncio.to_thread and the sync-endpoint threadpool copy the context, so queries run
+# off the event loop are still counted against the request that issued them.
+
+query_stats = contextvars.ContextVar("query_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = query_stats.get()
+    if stats is not None:
+        stats["count"] += 1
+        stats["seconds"] += elapsed
+
+event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+event.listen(engine, "after_cursor_execute", _after_cursor_execute)
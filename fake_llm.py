@@ -0,0 +1,142 @@
+# fake_llm.py
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from types import SimpleNamespace
+
+from google.api_core import exceptions as google_exceptions
+
+from conversation import ALLOWED_TAGS
+
+# A local stand-in for genai.GenerativeModel, selected with LLM_BACKEND=fake. It answers
+# every prompt main.py sends with plausible JSON, so load tests and benchmarks exercise
+# the real request path without spending Gemini quota.
+#
+# Latencies are distributions written as "kind:args":
+#   fixed:0.5   uniform:0.2:1.5   normal:mean:sd   lognormal:median:sigma
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "lognormal:1.2:0.4")
+# Streaming: time to the first chunk, then a delay per chunk of FAKE_LLM_CHUNK_CHARS.
+FAKE_LLM_FIRST_CHUNK = os.getenv("FAKE_LLM_FIRST_CHUNK", "lognormal:0.4:0.4")
+FAKE_LLM_CHUNK_DELAY = os.getenv("FAKE_LLM_CHUNK_DELAY", "fixed:0.02")
+FAKE_LLM_CHUNK_CHARS = int(os.getenv("FAKE_LLM_CHUNK_CHARS", "24"))
+# Fault injection, as a probability per call.
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_HANG_RATE = float(os.getenv("FAKE_LLM_HANG_RATE", "0"))
+FAKE_LLM_MALFORMED_RATE = float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0"))
+FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED")
+
+_rng = random.Random(FAKE_LLM_SEED)
+
+def parse_distribution(spec):
+    kind, *args = spec.split(":")
+    args = [float(arg) for arg in args]
+    if kind == "fixed":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: _rng.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda: max(0.0, _rng.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        # Parameterised by the median, which is what people usually know about a model.
+        return lambda: args[0] * _rng.lognormvariate(0.0, args[1])
+    raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+# --- CANNED OUTPUT ---
+
+CAREERS = [
+    "Software Developer", "Graphic Designer", "Teacher", "Entrepreneur",
+    "Accountant", "Mechanical Engineer", "Marine Biologist", "Nurse",
+]
+
+_CAREER_LINE = re.compile(r"^\s*- (.+)$", re.MULTILINE)
+_OPTION_LINE = re.compile(r"^\s*\d+\. ", re.MULTILINE)
+
+def _seed_for(prompt):
+    return int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+
+def fake_question(prompt):
+    pick = random.Random(_seed_for(prompt))
+    tags = pick.sample(ALLOWED_TAGS, 4)
+    return {
+        "question": f"Scenario #{pick.randint(100, 999)}: which of these would you enjoy most?",
+        "choices": [{"text": f"Something {tag.split(' & ')[0].lower()} (option {i + 1}).", "tag": tag} for i, tag in enumerate(tags)],
+    }
+
+def fake_recommendations(prompt):
+    chosen = _CAREER_LINE.findall(prompt.split("--- END TRANSCRIPT ---")[-1])
+    careers = chosen or random.Random(_seed_for(prompt)).sample(CAREERS, 3)
+    return {"recommendations": [
+        {"career": career.strip(), "reason": f"Why it's a good fit for you: your answers point towards {career.strip().lower()}."}
+        for career in careers
+    ]}
+
+def fake_document(prompt):
+    if "Tag each of these answer options" in prompt:
+        options = len(_OPTION_LINE.findall(prompt)) or 4
+        return {"tags": [ALLOWED_TAGS[i % len(ALLOWED_TAGS)] for i in range(options)]}
+    if "Rewrite it as valid JSON" in prompt:
+        return fake_recommendations("") if "recommendations" in prompt.split("--- TEXT ---")[0] else fake_question(prompt)
+    if "career analyst" in prompt:
+        return fake_recommendations(prompt)
+    return fake_question(prompt)
+
+def malform(text):
+    # The kinds of breakage seen from real models.
+    breakage = _rng.choice(["fence", "trailing_comma", "bad_tag", "truncated"])
+    if breakage == "fence":
+        return f"Sure! Here is the JSON:\n```json\n{text}\n```"
+    if breakage == "trailing_comma":
+        return text[:-1] + ",}"
+    if breakage == "bad_tag":
+        return text.replace(" & Creative", "").replace(" & Helping", "s")
+    return text[: max(1, int(len(text) * 0.8))]
+
+# --- MODEL ---
+
+class FakeResponse:
+    def __init__(self, text, prompt, full_text=None):
+        self.text = text
+        # Like Gemini, streams only report usage on the final chunk.
+        full_text = text if full_text is None else full_text
+        self.usage_metadata = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(full_text) // 4)
+
+class FakeStream:
+    def __init__(self, text, prompt, first_chunk, chunk_delay):
+        self._parts = [text[i:i + FAKE_LLM_CHUNK_CHARS] for i in range(0, len(text), FAKE_LLM_CHUNK_CHARS)]
+        self._text = text
+        self._prompt = prompt
+        self._first_chunk = first_chunk
+        self._chunk_delay = chunk_delay
+
+    async def __aiter__(self):
+        for i, part in enumerate(self._parts):
+            await asyncio.sleep(self._first_chunk() if i == 0 else self._chunk_delay())
+            last = i == len(self._parts) - 1
+            yield FakeResponse(part, self._prompt if last else "", self._text if last else "")
+
+class FakeGenerativeModel:
+    def __init__(self, model_name="fake-llm"):
+        self.model_name = model_name
+        self._latency = parse_distribution(FAKE_LLM_LATENCY)
+        self._first_chunk = parse_distribution(FAKE_LLM_FIRST_CHUNK)
+        self._chunk_delay = parse_distribution(FAKE_LLM_CHUNK_DELAY)
+
+    async def generate_content_async(self, prompt, stream=False, request_options=None, **kwargs):
+        roll = _rng.random()
+        if roll < FAKE_LLM_ERROR_RATE:
+            await asyncio.sleep(self._first_chunk())
+            raise google_exceptions.ServiceUnavailable("Injected fake LLM error")
+        if roll < FAKE_LLM_ERROR_RATE + FAKE_LLM_HANG_RATE:
+            # Hangs until the caller's timeout gives up on it.
+            await asyncio.sleep(3600)
+        text = json.dumps(fake_document(prompt))
+        if _rng.random() < FAKE_LLM_MALFORMED_RATE:
+            text = malform(text)
+        if stream:
+            return FakeStream(text, prompt, self._first_chunk, self._chunk_delay)
+        await asyncio.sleep(self._latency())
+        return FakeResponse(text, prompt)
@@ -0,0 +1,190 @@
+# llm.py
+
+import asyncio
+import math
+import os
+import random
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+from metrics import llm_shed, llm_calls, llm_time_to_first_token, llm_total_time, llm_prompt_chars, llm_response_chars, llm_tokens
+from tracing import span
+
+# --- SETTINGS ---
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "45"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+# Admission control: once every slot is busy, at most this many calls wait for one;
+# the rest are rejected straight away with LLMOverloadedError (HTTP 503 + Retry-After).
+LLM_MAX_QUEUED = int(os.getenv("LLM_MAX_QUEUED", "32"))
+LLM_RETRY_AFTER_SECONDS = float(os.getenv("LLM_RETRY_AFTER_SECONDS", "5"))
+
+RETRYABLE_ERRORS = (
+    asyncio.TimeoutError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.TooManyRequests,
+)
+
+class LLMTimeoutError(Exception):
+    pass
+
+class LLMOverloadedError(Exception):
+    def __init__(self, message, retry_after=LLM_RETRY_AFTER_SECONDS):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+# Every LLM call in this worker goes through the same semaphore, so a burst of
+# slow generations can never hold more than LLM_MAX_CONCURRENCY upstream calls.
+# The calls themselves are awaited on the event loop and never occupy the
+# threadpool that serves the sync endpoints such as /quizzes/{quiz_id}.
+_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+_queued = 0
+
+def has_free_slot():
+    return not _semaphore.locked()
+
+async def _acquire_slot(timeout):
+    global _queued
+    if not _semaphore.locked():
+        # A free slot is taken without suspending, so a burst arriving in the same
+        # event loop tick is counted against the queue limit instead of slipping past it.
+        await _semaphore.acquire()
+        return
+    if _queued >= LLM_MAX_QUEUED:
+        llm_shed.inc(reason="queue_full")
+        raise LLMOverloadedError(f"Too many LLM requests in progress ({_queued} already queued)")
+    _queued += 1
+    try:
+        await asyncio.wait_for(_semaphore.acquire(), timeout)
+    except asyncio.TimeoutError:
+        llm_shed.inc(reason="queue_timeout")
+        raise LLMOverloadedError(f"No LLM slot became free within {timeout:.1f}s") from None
+    finally:
+        _queued -= 1
+
+def _backoff(attempt):
+    # "Full jitter" exponential backoff.
+    return random.uniform(0, LLM_RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+
+async def _call_with_retries(call, keep_slot=False, budget=None):
+    # keep_slot=True leaves the semaphore held on success; the caller must release it.
+    # `budget` replaces LLM_DEADLINE_SECONDS for callers with their own latency budget.
+    budget = budget or LLM_DEADLINE_SECONDS
+    deadline = time.monotonic() + budget
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeoutError(f"LLM deadline of {budget:.1f}s exceeded after {attempt - 1} attempt(s)")
+        timeout = min(LLM_TIMEOUT_SECONDS, remaining)
+        try:
+            await _acquire_slot(timeout)
+            try:
+                result = await asyncio.wait_for(call(timeout), timeout)
+            except BaseException:
+                _semaphore.release()
+                raise
+            if not keep_slot:
+                _semaphore.release()
+            return result
+        except RETRYABLE_ERRORS as e:
+            delay = _backoff(attempt)
+            if attempt >= LLM_MAX_ATTEMPTS or time.monotonic() + delay >= deadline:
+                if isinstance(e, (asyncio.TimeoutError, google_exceptions.DeadlineExceeded)):
+                    raise LLMTimeoutError(f"LLM call timed out after {attempt} attempt(s)") from e
+                raise
+            await asyncio.sleep(delay)
+
+# --- INSTRUMENTATION ---
+
+def _outcome(error):
+    if isinstance(error, LLMTimeoutError):
+        return "timeout"
+    if isinstance(error, LLMOverloadedError):
+        return "shed"
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    return "error"
+
+def _record(mode, prompt, text, response, first_token, total, trace):
+    # Token counts come from usage_metadata when the model reports it, else ~4 chars/token.
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or len(prompt) // 4
+    response_tokens = getattr(usage, "candidates_token_count", 0) or len(text) // 4
+    llm_calls.inc(mode=mode, outcome="ok")
+    llm_time_to_first_token.observe(first_token, mode=mode)
+    llm_total_time.observe(total, mode=mode)
+    llm_prompt_chars.observe(len(prompt), mode=mode)
+    llm_response_chars.observe(len(text), mode=mode)
+    llm_tokens.inc(prompt_tokens, mode=mode, direction="prompt")
+    llm_tokens.inc(response_tokens, mode=mode, direction="response")
+    trace.set(
+        time_to_first_token_ms=round(first_token * 1000, 1), response_chars=len(text),
+        prompt_tokens=prompt_tokens, response_tokens=response_tokens,
+    )
+
+# --- CALLS ---
+
+async def generate_text(model, prompt, budget=None, **kwargs):
+    started = time.perf_counter()
+    with span("llm.generate", model=getattr(model, "model_name", ""), prompt_chars=len(prompt)) as trace:
+        try:
+            response = await _call_with_retries(
+                lambda timeout: model.generate_content_async(prompt, request_options={"timeout": timeout}, **kwargs),
+                budget=budget,
+            )
+            text = response.text
+        except BaseException as e:
+            llm_calls.inc(mode="generate", outcome=_outcome(e))
+            raise
+        elapsed = time.perf_counter() - started
+        # Non-streaming calls get nothing before the whole response, so TTFT == total.
+        _record("generate", prompt, text, response, elapsed, elapsed, trace)
+    return text
+
+async def stream_text(model, prompt, budget=None, **kwargs):
+    # Retries only cover opening the stream and receiving the first chunk; once
+    # text has been yielded to the caller a failure is final.
+    async def open_stream(timeout):
+        response = await model.generate_content_async(prompt, stream=True, request_options={"timeout": timeout}, **kwargs)
+        chunks = response.__aiter__()
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = None
+        return chunks, first
+
+    started = time.perf_counter()
+    with span("llm.stream", model=getattr(model, "model_name", ""), prompt_chars=len(prompt)) as trace:
+        try:
+            chunks, chunk = await _call_with_retries(open_stream, keep_slot=True, budget=budget)
+        except BaseException as e:
+            llm_calls.inc(mode="stream", outcome=_outcome(e))
+            raise
+        first_token = time.perf_counter() - started
+        text, last = [], chunk
+        try:
+            while chunk is not None:
+                last = chunk
+                if chunk.text:
+                    text.append(chunk.text)
+                    yield chunk.text
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), LLM_TIMEOUT_SECONDS)
+                except StopAsyncIteration:
+                    chunk = None
+                except asyncio.TimeoutError as e:
+                    raise LLMTimeoutError(f"LLM stream stalled for more than {LLM_TIMEOUT_SECONDS}s") from e
+        except BaseException as e:
+            llm_calls.inc(mode="stream", outcome=_outcome(e))
+            raise
+        finally:
+            _semaphore.release()
+        _record("stream", prompt, "".join(text), last, first_token, time.perf_counter() - started, trace)
@@ -0,0 +1,163 @@
+# llm_cache.py
+
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import time
+
+from cachetools import TTLCache
+from sqlalchemy import delete
+
+import models
+from conversation import normalized_state
+from prompt_builder import prompt_arm
+from database import SessionLocal
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "10000"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+# Set LLM_CACHE_PERSISTENT=1 to keep entries in the database so they survive restarts.
+LLM_CACHE_PERSISTENT = os.getenv("LLM_CACHE_PERSISTENT", "0") == "1"
+LLM_CACHE_PERSISTENT_TTL_SECONDS = float(os.getenv("LLM_CACHE_PERSISTENT_TTL_SECONDS", str(7 * 86400)))
+# Expired rows are deleted at most this often, by whichever write comes due.
+LLM_CACHE_PRUNE_INTERVAL_SECONDS = float(os.getenv("LLM_CACHE_PRUNE_INTERVAL_SECONDS", "600"))
+
+# Bump when a prompt changes in a way that should invalidate earlier answers.
+PROMPT_VERSION = 2
+
+def cache_key(kind, model_name, convo_input):
+    # Compacted and full-transcript prompts are cached apart, so an A/B run compares
+    # what each arm actually generated.
+    payload = {
+        "kind": kind, "model": model_name, "prompt_version": PROMPT_VERSION,
+        "prompt_arm": prompt_arm(convo_input.user_age, convo_input.hobbies), **normalized_state(convo_input),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+# --- PERSISTENT TIER ---
+
+def _load_persistent(key):
+    db = SessionLocal()
+    try:
+        entry = db.get(models.LLMCacheEntry, key)
+        if entry is None:
+            return None
+        age = datetime.datetime.utcnow() - entry.created_at
+        if age.total_seconds() > LLM_CACHE_PERSISTENT_TTL_SECONDS:
+            return None
+        return json.loads(entry.value)
+    finally:
+        db.close()
+
+def _store_persistent(key, kind, value):
+    db = SessionLocal()
+    try:
+        db.merge(models.LLMCacheEntry(key=key, kind=kind, value=json.dumps(value), created_at=datetime.datetime.utcnow()))
+        db.commit()
+    except Exception:
+        db.rollback()
+    finally:
+        db.close()
+
+def _prune_persistent():
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=LLM_CACHE_PERSISTENT_TTL_SECONDS)
+    db = SessionLocal()
+    try:
+        deleted = db.execute(delete(models.LLMCacheEntry).where(models.LLMCacheEntry.created_at < cutoff)).rowcount
+        db.commit()
+    finally:
+        db.close()
+    return deleted
+
+# --- CACHE ---
+
+class _LeaderCancelled(Exception):
+    # Set on a single-flight future whose caller was cancelled (e.g. a discarded
+    # speculative branch); the waiters retry instead of being cancelled with it.
+    pass
+
+class LLMCache:
+    def __init__(self, maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL_SECONDS, persistent=LLM_CACHE_PERSISTENT):
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+        self._waiters = {}
+        self.persistent = persistent
+        self._last_prune = time.monotonic()
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "coalesced": 0, "misses": 0}
+
+    async def lookup(self, key):
+        if key in self._memory:
+            self.stats["memory_hits"] += 1
+            return self._memory[key]
+        if self.persistent:
+            value = await asyncio.to_thread(_load_persistent, key)
+            if value is not None:
+                self.stats["persistent_hits"] += 1
+                self._memory[key] = value
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    async def store(self, key, kind, value):
+        self._memory[key] = value
+        if self.persistent:
+            await asyncio.to_thread(_store_persistent, key, kind, value)
+            if time.monotonic() - self._last_prune >= LLM_CACHE_PRUNE_INTERVAL_SECONDS:
+                self._last_prune = time.monotonic()
+                await self.prune()
+
+    async def prune(self):
+        return await asyncio.to_thread(_prune_persistent)
+
+    def is_awaited(self, key):
+        return self._waiters.get(key, 0) > 0
+
+    async def get_or_generate(self, key, kind, generate):
+        while True:
+            if key in self._memory:
+                self.stats["memory_hits"] += 1
+                return self._memory[key]
+            # Single-flight: concurrent identical requests wait on the first caller's upstream call.
+            if key not in self._inflight:
+                return await self._generate(key, kind, generate)
+            self.stats["coalesced"] += 1
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except _LeaderCancelled:
+                # The first waiter to get here becomes the new leader.
+                continue
+            finally:
+                self._waiters[key] -= 1
+                if not self._waiters[key]:
+                    del self._waiters[key]
+
+    async def _generate(self, key, kind, generate):
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self.lookup(key)
+            if value is None:
+                value = await generate()
+                await self.store(key, kind, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so an uncontended failure is not logged as unhandled.
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def snapshot(self):
+        lookups = sum(self.stats.values())
+        hits = lookups - self.stats["misses"]
+        return {**self.stats, "size": len(self._memory), "hit_rate": hits / lookups if lookups else 0.0}
+
+llm_cache = LLMCache()
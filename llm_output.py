@@ -0,0 +1,248 @@
+# llm_output.py
+
+import difflib
+import json
+import os
+import re
+
+from pydantic import ValidationError
+
+import prompts, schemas
+from conversation import ALLOWED_TAGS
+
+# auto: JSON mode with a response schema for Gemini models only (Gemma models reject it).
+# on / off force it either way.
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "auto")
+
+class LLMOutputError(ValueError):
+    pass
+
+# responses: every parsed response   repaired: fixed locally (fences, commas, tag names)
+# reasked: needed a targeted re-ask   failed: unusable even after the re-ask
+output_stats = {"responses": 0, "repaired": 0, "reasked": 0, "failed": 0}
+
+def output_snapshot():
+    responses = output_stats["responses"]
+    rates = {
+        f"{name}_rate": round(output_stats[name] / responses, 4) if responses else 0.0
+        for name in ("repaired", "reasked", "failed")
+    }
+    return {**output_stats, **rates}
+
+# --- JSON MODE ---
+
+_SCHEMA_KEYS = {
+    "type": "type", "enum": "enum", "required": "required", "description": "description",
+    "minItems": "min_items", "maxItems": "max_items",
+}
+
+def _gemini_schema(node, defs):
+    if "$ref" in node:
+        return _gemini_schema(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+    schema = {}
+    for key, value in node.items():
+        if key == "properties":
+            schema["properties"] = {name: _gemini_schema(prop, defs) for name, prop in value.items()}
+        elif key == "items":
+            schema["items"] = _gemini_schema(value, defs)
+        elif key in _SCHEMA_KEYS:
+            schema[_SCHEMA_KEYS[key]] = value
+    if "enum" in schema:
+        schema["format"] = "enum"
+    return schema
+
+def response_schema(model_cls):
+    # Gemini takes an OpenAPI subset: no $ref / titles, and snake_case array limits.
+    json_schema = model_cls.model_json_schema()
+    return _gemini_schema(json_schema, json_schema.get("$defs", {}))
+
+def json_mode_enabled(model_name):
+    if LLM_JSON_MODE == "auto":
+        return "gemini" in (model_name or "").lower()
+    return LLM_JSON_MODE == "on"
+
+def generation_kwargs(model_name, model_cls):
+    if not json_mode_enabled(model_name):
+        return {}
+    if model_cls is None:
+        # Re-asks (JSON fix, retagging) have no schema of their own; they still want JSON.
+        return {"generation_config": {"response_mime_type": "application/json"}}
+    return {"generation_config": {"response_mime_type": "application/json", "response_schema": response_schema(model_cls)}}
+
+# --- EXTRACTION ---
+
+_FENCE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+def _strip_trailing_commas(text):
+    out, in_string, escape = [], False, False
+    for i, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "," and text[i + 1:].lstrip()[:1] in ("}", "]"):
+            continue
+        out.append(c)
+    return "".join(out)
+
+def extract_json(text):
+    # Pulls the first JSON object out of model output. Tolerates code fences, prose
+    # around the object, trailing commas and output cut off before the closing braces.
+    text = _FENCE.sub("", text or "")
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object in model output")
+    closers, in_string, escape, end = [], False, False, None
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            closers.append("}" if c == "{" else "]")
+        elif c in "}]" and closers:
+            closers.pop()
+            if not closers:
+                end = i + 1
+                break
+    if end is not None:
+        candidate = text[start:end]
+    else:
+        candidate = text[start:].rstrip() + ('"' if in_string else "") + "".join(reversed(closers))
+    data = json.loads(_strip_trailing_commas(candidate))
+    if not isinstance(data, dict):
+        raise ValueError("Model output is not a JSON object")
+    return data
+
+def _load(text):
+    # Returns (data, clean); clean is False when the text needed extracting.
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data, True
+    except (TypeError, ValueError):
+        pass
+    try:
+        return extract_json(text), False
+    except ValueError:
+        return None, False
+
+# --- TAGS ---
+
+_TAG_LOOKUP = {tag.lower(): tag for tag in ALLOWED_TAGS}
+for _tag in ALLOWED_TAGS:
+    for _word in re.split(r"[^a-z]+", _tag.lower()):
+        if len(_word) > 3:
+            _TAG_LOOKUP.setdefault(_word, _tag)
+
+def normalize_tag(tag):
+    # Maps near misses ("artistic and creative", "Analytical", "Realistic/Hands-on")
+    # onto the allowed tag names; None if nothing is close.
+    if not isinstance(tag, str):
+        return None
+    key = _WHITESPACE.sub(" ", tag.strip().lower()).replace(" and ", " & ")
+    if key in _TAG_LOOKUP:
+        return _TAG_LOOKUP[key]
+    match = difflib.get_close_matches(key, list(_TAG_LOOKUP), n=1, cutoff=0.75)
+    if match:
+        return _TAG_LOOKUP[match[0]]
+    words = [word for word in re.split(r"[^a-z]+", key) if word in _TAG_LOOKUP]
+    return _TAG_LOOKUP[words[0]] if words else None
+
+# --- REPAIR ---
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ""
+
+def repair_question(data):
+    # Returns (document, broken) where broken lists the choices whose tag couldn't be mapped.
+    choices = [choice for choice in data.get("choices") or [] if isinstance(choice, dict)]
+    document = {
+        "question": _text(data.get("question") or data.get("text")),
+        "choices": [{"text": _text(choice.get("text")), "tag": normalize_tag(choice.get("tag"))} for choice in choices],
+    }
+    broken = [i for i, choice in enumerate(document["choices"]) if choice["tag"] is None]
+    return document, broken
+
+def repair_choice(choice):
+    # Per-item check for streamed choices; None drops the item.
+    if not isinstance(choice, dict):
+        return None
+    tag = normalize_tag(choice.get("tag"))
+    text = _text(choice.get("text"))
+    return {"text": text, "tag": tag} if tag and text else None
+
+def repair_recommendation(item):
+    if not isinstance(item, dict):
+        return None
+    career, reason = _text(item.get("career")), _text(item.get("reason"))
+    return {"career": career, "reason": reason} if career and reason else None
+
+def repair_recommendations(data):
+    items = [repair_recommendation(item) for item in data.get("recommendations") or []]
+    return {"recommendations": [item for item in items if item]}, []
+
+async def retag_choices(document, broken, reask):
+    # Asks only for the tags that are missing instead of regenerating the question.
+    texts = [document["choices"][i]["text"] for i in broken]
+    data, _ = _load(await reask(prompts.render_retag_prompt(document["question"], texts)))
+    tags = (data or {}).get("tags") or []
+    for i, tag in zip(broken, tags):
+        document["choices"][i]["tag"] = normalize_tag(tag)
+    document["choices"] = [choice for choice in document["choices"] if choice["tag"]]
+    return document
+
+# --- PARSING ---
+
+def _valid(model_cls, data):
+    try:
+        model_cls.model_validate(data)
+        return True
+    except ValidationError:
+        return False
+
+def _fail(message):
+    output_stats["failed"] += 1
+    raise LLMOutputError(message)
+
+async def parse_output(text, model_cls, repair, reask, fix_part=None):
+    # Extract -> repair locally -> re-ask for the broken part -> validate against model_cls.
+    # `reask` is an async callable taking a prompt and returning the model's text.
+    output_stats["responses"] += 1
+    data, clean = _load(text)
+    if data is None:
+        output_stats["reasked"] += 1
+        schema = json.dumps(model_cls.model_json_schema())
+        data, _ = _load(await reask(prompts.render_json_fix_prompt(text, schema)))
+        clean = False
+        if data is None:
+            _fail("The model did not return valid JSON")
+    document, broken = repair(data)
+    if broken and fix_part is not None:
+        output_stats["reasked"] += 1
+        document = await fix_part(document, broken, reask)
+    try:
+        result = model_cls.model_validate(document).model_dump()
+    except ValidationError as e:
+        _fail(f"The model returned an invalid {model_cls.__name__}: {e.errors()[0]['msg']}")
+    if not clean or not _valid(model_cls, data):
+        output_stats["repaired"] += 1
+    return result
+
+async def parse_question(text, reask):
+    return await parse_output(text, schemas.GeneratedQuestion, repair_question, reask, retag_choices)
+
+async def parse_recommendations(text, reask):
+    return await parse_output(text, schemas.GeneratedRecommendations, repair_recommendations, reask)
@@ -0,0 +1,260 @@
+# llm_router.py
+
+import asyncio
+import collections
+import os
+import time
+
+import metrics
+from llm import generate_text, stream_text, LLMOverloadedError, LLMTimeoutError, LLM_RETRY_AFTER_SECONDS
+from llm_output import generation_kwargs
+
+# Each task has its own route: an ordered list of models (primary first), a latency
+# budget for the whole call including failover, and a p95 limit for its breakers.
+# Routes are configured from the environment when create_router() runs, i.e. after
+# main.py has loaded .env:
+#   LLM_<TASK>_MODELS           comma-separated, e.g. "gemma-3n-e4b-it,gemini-2.0-flash-lite"
+#   LLM_<TASK>_BUDGET_SECONDS   give up (504) after this long
+#   LLM_<TASK>_P95_SECONDS      trip a model's breaker when its recent p95 is above this;
+#                               also the longest one model may try while a fallback remains
+ROUTE_DEFAULTS = {
+    # Short next-question generation: a small, fast model.
+    "question": {"models": "gemma-3n-e4b-it,gemini-2.0-flash-lite", "budget": 15.0, "p95": 6.0},
+    # The final analysis: a stronger model, with the original one as the fallback.
+    "recommendations": {"models": "gemini-2.5-flash,gemma-3n-e4b-it", "budget": 45.0, "p95": 25.0},
+}
+
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# --- CIRCUIT BREAKER ---
+
+class CircuitBreaker:
+    # closed -> open when the error rate or p95 over the last LLM_BREAKER_WINDOW calls
+    # crosses its limit; open -> half_open after the cooldown, letting one probe call
+    # through; the probe closes it again or re-opens it.
+
+    def __init__(self, p95_limit):
+        self.p95_limit = p95_limit
+        self.state = "closed"
+        self.reason = None
+        self._samples = collections.deque(maxlen=LLM_BREAKER_WINDOW)
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self):
+        if self.state == "open" and time.monotonic() - self._opened_at >= LLM_BREAKER_COOLDOWN_SECONDS:
+            self.state = "half_open"
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def available(self):
+        # Like allow(), without claiming the half-open probe.
+        if self.state == "open":
+            return time.monotonic() - self._opened_at >= LLM_BREAKER_COOLDOWN_SECONDS
+        return not (self.state == "half_open" and self._probing)
+
+    def release(self):
+        # The call ended without telling us anything about the model (cancelled / shed).
+        self._probing = False
+
+    def record(self, seconds, ok):
+        if self.state == "half_open":
+            self._probing = False
+            if ok and seconds <= self.p95_limit:
+                self.state, self.reason = "closed", None
+                self._samples.clear()
+            else:
+                self._trip("probe failed")
+            return
+        self._samples.append((seconds, ok))
+        if len(self._samples) < LLM_BREAKER_MIN_CALLS:
+            return
+        error_rate, p95 = self.error_rate(), self.p95()
+        if error_rate >= LLM_BREAKER_ERROR_RATE:
+            self._trip(f"error rate {error_rate:.0%}")
+        elif p95 > self.p95_limit:
+            self._trip(f"p95 {p95:.1f}s over {self.p95_limit:.1f}s")
+
+    def _trip(self, reason):
+        self.state, self.reason = "open", reason
+        self._opened_at = time.monotonic()
+        self._probing = False
+
+    def retry_after(self):
+        if self.state != "open":
+            return 0.0
+        return max(0.0, LLM_BREAKER_COOLDOWN_SECONDS - (time.monotonic() - self._opened_at))
+
+    def error_rate(self):
+        return sum(1 for _, ok in self._samples if not ok) / len(self._samples) if self._samples else 0.0
+
+    def p95(self):
+        latencies = sorted(seconds for seconds, ok in self._samples if ok)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "reason": self.reason,
+            "calls": len(self._samples),
+            "error_rate": round(self.error_rate(), 4),
+            "p95_seconds": round(self.p95(), 3),
+            "p95_limit_seconds": self.p95_limit,
+            "retry_after_seconds": round(self.retry_after(), 1),
+        }
+
+# --- ROUTES ---
+
+class Route:
+    def __init__(self, task, models, budget, p95_limit):
+        self.task = task
+        self.models = models
+        self.budget = budget
+        self.breakers = [CircuitBreaker(p95_limit) for _ in models]
+
+    @property
+    def name(self):
+        # Cache namespace for this route's output, whichever model ends up serving it.
+        return self.models[0].model_name
+
+    def _unavailable(self):
+        retry_after = min(breaker.retry_after() for breaker in self.breakers)
+        metrics.llm_shed.inc(reason="circuit_open")
+        return LLMOverloadedError(f"Every {self.task} model is unavailable right now", retry_after or LLM_RETRY_AFTER_SECONDS)
+
+    def _exhausted(self, last_error):
+        # Nothing left to try. A timeout stays a timeout (504); any other provider error
+        # means the whole route is down right now, which callers treat like shedding
+        # (503 + Retry-After, matcher fallback) instead of a 500.
+        if last_error is None:
+            return self._unavailable()
+        if isinstance(last_error, LLMTimeoutError):
+            return last_error
+        error = LLMOverloadedError(f"Every {self.task} model failed, last error: {last_error!r}", LLM_RETRY_AFTER_SECONDS)
+        error.__cause__ = last_error
+        return error
+
+    def check(self):
+        # Cheap pre-flight for streaming endpoints, so they can answer 503 before the
+        # 200 and the event stream have started.
+        if all(breaker.state == "open" and breaker.retry_after() > 0 for breaker in self.breakers):
+            raise self._unavailable()
+
+    def _attempt_budget(self, index, remaining):
+        # A model gets at most its p95 limit while a later model could still take over,
+        # so a slow primary can't spend the whole route budget and leave the fallback
+        # nothing; the last available model gets whatever is left.
+        if any(breaker.available() for breaker in self.breakers[index + 1:]):
+            return min(remaining, self.breakers[index].p95_limit)
+        return remaining
+
+    def _failed(self, model, breaker, started):
+        breaker.record(time.monotonic() - started, False)
+        metrics.llm_failovers.inc(route=self.task, model=model.model_name)
+
+    async def generate(self, prompt, model_cls=None):
+        # Tries the route's models in order within one shared budget. Shedding
+        # (LLMOverloadedError) is local back-pressure, not a model failure, so it is
+        # raised straight away and never trips a breaker.
+        deadline = time.monotonic() + self.budget
+        last_error = None
+        for index, (model, breaker) in enumerate(zip(self.models, self.breakers)):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not breaker.allow():
+                continue
+            started = time.monotonic()
+            try:
+                text = await generate_text(model, prompt, budget=self._attempt_budget(index, remaining), **generation_kwargs(model.model_name, model_cls))
+            except (LLMOverloadedError, asyncio.CancelledError):
+                breaker.release()
+                raise
+            except Exception as e:
+                self._failed(model, breaker, started)
+                last_error = e
+                continue
+            breaker.record(time.monotonic() - started, True)
+            return text
+        raise self._exhausted(last_error)
+
+    async def stream(self, prompt, model_cls=None):
+        # Same as generate(), but failover is only possible until the first chunk; the
+        # breaker sees time to first chunk for streamed calls.
+        deadline = time.monotonic() + self.budget
+        last_error = None
+        for index, (model, breaker) in enumerate(zip(self.models, self.breakers)):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not breaker.allow():
+                continue
+            started = time.monotonic()
+            chunks = stream_text(model, prompt, budget=self._attempt_budget(index, remaining), **generation_kwargs(model.model_name, model_cls))
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except (LLMOverloadedError, asyncio.CancelledError):
+                breaker.release()
+                raise
+            except Exception as e:
+                self._failed(model, breaker, started)
+                last_error = e
+                continue
+            breaker.record(time.monotonic() - started, True)
+            if first is not None:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+            return
+        raise self._exhausted(last_error)
+
+    def snapshot(self):
+        return {
+            "budget_seconds": self.budget,
+            "models": [
+                {"model": model.model_name, **breaker.snapshot()}
+                for model, breaker in zip(self.models, self.breakers)
+            ],
+        }
+
+class LLMRouter:
+    def __init__(self, routes):
+        self.routes = routes
+
+    def route(self, task):
+        return self.routes[task]
+
+    def snapshot(self):
+        return {task: route.snapshot() for task, route in self.routes.items()}
+
+# --- SETUP ---
+
+def route_config(task):
+    defaults = ROUTE_DEFAULTS[task]
+    prefix = f"LLM_{task.upper()}"
+    return {
+        "models": [name.strip() for name in os.getenv(f"{prefix}_MODELS", defaults["models"]).split(",") if name.strip()],
+        "budget": float(os.getenv(f"{prefix}_BUDGET_SECONDS", defaults["budget"])),
+        "p95": float(os.getenv(f"{prefix}_P95_SECONDS", defaults["p95"])),
+    }
+
+def create_model(name, backend):
+    if backend == "fake":
+        from fake_llm import FakeGenerativeModel
+        return FakeGenerativeModel(f"fake-{name}")
+    import google.generativeai as genai
+    return genai.GenerativeModel(name)
+
+def create_router(backend=None):
+    # backend: "gemini" (the real API; genai.configure must have run) or "fake".
+    backend = backend or os.getenv("LLM_BACKEND", "gemini")
+    routes = {}
+    for task in ROUTE_DEFAULTS:
+        config = route_config(task)
+        routes[task] = Route(task, [create_model(name, backend) for name in config["models"]], config["budget"], config["p95"])
+    return LLMRouter(routes)
@@ -0,0 +1,333 @@
+# loadtest.py
+#
+# Simulates N concurrent users walking through the quiz and reports throughput and
+# p50/p95/p99 per endpoint. Results can be saved as a JSON baseline and later runs
+# compared against it, so a regression in any endpoint shows up as a diff.
+#
+#   python loadtest.py --spawn                                   # fake LLM + SQLite, own server
+#   python loadtest.py --spawn --database-url postgresql://...   # same against Postgres
+#   python loadtest.py --base-url http://127.0.0.1:8000 --users 50
+#   python loadtest.py --spawn --save benchmarks/sqlite-fake.json
+#   python loadtest.py --spawn --compare benchmarks/sqlite-fake.json
+#   python loadtest.py --spawn --questions 20 --prompt-compaction ab  # prompt size per arm
+#   python loadtest.py --spawn --workers 4                        # through serve.py, like production
+#
+# Flows:
+#   session    what app.py does today: POST /sessions, one POST per answer (stored questions
+#              first, then LLM turns), then the streamed recommendations.
+#   stateless  the original client: GET /quizzes/1, answer its questions locally, one
+#              /generate-conversational-question per remaining turn, /generate-ai-recommendations.
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from conversation import answer_turn
+from sse import iter_sse
+
+AGES = ["10", "12", "13", "15", "grade 8", "17"]
+HOBBIES = ["painting", "football", "video games", "coding", "reading", "music", "cooking", "robotics"]
+
+# --- RECORDING ---
+
+class Recorder:
+    def __init__(self):
+        self.samples = []
+        self.flows = {"completed": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, seconds, ok):
+        with self._lock:
+            self.samples.append((endpoint, seconds, ok))
+
+    def flow_done(self, ok):
+        with self._lock:
+            self.flows["completed" if ok else "failed"] += 1
+
+def timed(http, recorder, endpoint, method, url, **kwargs):
+    started = time.perf_counter()
+    ok = False
+    try:
+        response = http.request(method, url, timeout=120, **kwargs)
+        ok = response.ok
+        return response
+    finally:
+        recorder.add(endpoint, time.perf_counter() - started, ok)
+
+# --- FLOWS ---
+
+def new_user(rng):
+    return rng.choice(AGES), rng.sample(HOBBIES, rng.randint(0, 3))
+
+def session_flow(http, base_url, recorder, rng, args):
+    user_age, hobbies = new_user(rng)
+    response = timed(http, recorder, "POST /sessions", "POST", f"{base_url}/sessions", json={
+        "user_age": user_age, "hobbies": hobbies, "total_questions": args.questions,
+    })
+    response.raise_for_status()
+    view = response.json()
+    while not view["complete"]:
+        time.sleep(args.think_time)
+        choice_index = rng.randrange(len(view["question"]["choices"]))
+        response = timed(
+            http, recorder, "POST /sessions/{id}/answers", "POST",
+            f"{base_url}/sessions/{view['session_id']}/answers", json={"choice_index": choice_index},
+        )
+        response.raise_for_status()
+        view = response.json()
+
+    endpoint = "GET /sessions/{id}/recommendations/stream"
+    started = time.perf_counter()
+    first, done = None, False
+    try:
+        with http.get(f"{base_url}/sessions/{view['session_id']}/recommendations/stream", stream=True, timeout=120) as response:
+            response.raise_for_status()
+            for event, data in iter_sse(response):
+                if event == "recommendation" and first is None:
+                    first = time.perf_counter() - started
+                elif event == "done":
+                    done = True
+                elif event == "error":
+                    raise RuntimeError(data.get("detail"))
+    finally:
+        recorder.add(endpoint, time.perf_counter() - started, done)
+        if first is not None:
+            recorder.add(endpoint + " [first event]", first, True)
+    if not done:
+        raise RuntimeError("Recommendation stream ended without a done event")
+
+def stateless_flow(http, base_url, recorder, rng, args):
+    user_age, hobbies = new_user(rng)
+    response = timed(http, recorder, "GET /quizzes/{id}", "GET", f"{base_url}/quizzes/1")
+    response.raise_for_status()
+    history = []
+    for question in response.json()["questions"][:args.questions]:
+        time.sleep(args.think_time)
+        history.append(answer_turn(question["text"], rng.choice(question["choices"])))
+    while len(history) < args.questions:
+        time.sleep(args.think_time)
+        response = timed(http, recorder, "POST /generate-conversational-question", "POST", f"{base_url}/generate-conversational-question", json={
+            "conversation_history": history, "user_age": user_age, "hobbies": hobbies,
+        })
+        response.raise_for_status()
+        question = response.json()
+        history.append(answer_turn(question["question"], rng.choice(question["choices"])))
+    response = timed(http, recorder, "POST /generate-ai-recommendations", "POST", f"{base_url}/generate-ai-recommendations", json={
+        "conversation_history": history, "user_age": user_age, "hobbies": hobbies,
+    })
+    response.raise_for_status()
+
+FLOWS = {"session": session_flow, "stateless": stateless_flow}
+
+def run_user(user_index, base_url, recorder, args):
+    rng = random.Random(args.seed * 100003 + user_index)
+    http = requests.Session()
+    http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+    flow = FLOWS[args.flow]
+    for _ in range(args.sessions):
+        try:
+            flow(http, base_url, recorder, rng, args)
+            recorder.flow_done(True)
+        except Exception as e:
+            recorder.flow_done(False)
+            print(f"user {user_index}: {e!r}", file=sys.stderr)
+
+# --- REPORTING ---
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+def summarize(recorder, wall_seconds):
+    by_endpoint = {}
+    for endpoint, seconds, ok in recorder.samples:
+        by_endpoint.setdefault(endpoint, []).append((seconds, ok))
+    endpoints = {}
+    for endpoint, samples in sorted(by_endpoint.items()):
+        latencies = sorted(seconds for seconds, _ in samples)
+        endpoints[endpoint] = {
+            "count": len(samples),
+            "errors": sum(1 for _, ok in samples if not ok),
+            "rps": round(len(samples) / wall_seconds, 3),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "flows": dict(recorder.flows),
+        "flows_per_second": round(recorder.flows["completed"] / wall_seconds, 3),
+        "endpoints": endpoints,
+    }
+
+def prompt_stats(base_url):
+    # Mean estimated prompt tokens per prompt kind and compaction arm, from /metrics
+    # (merged across workers when the server runs several; see metrics.py).
+    totals = {}
+    for line in requests.get(f"{base_url}/metrics", timeout=10).text.splitlines():
+        for suffix in ("_sum", "_count"):
+            prefix = f"zhero_prompt_tokens{suffix}{{"
+            if line.startswith(prefix):
+                labels, value = line[len(prefix):].split("} ")
+                totals.setdefault(labels, {})[suffix] = float(value)
+    stats = {}
+    for labels, values in sorted(totals.items()):
+        label = dict(re.findall(r'(\w+)="([^"]*)"', labels))
+        name = f"{label['kind']} [{label['arm']}]"
+        stats[name] = {"count": int(values["_count"]), "mean_tokens": round(values["_sum"] / values["_count"], 1) if values["_count"] else 0.0}
+    return stats
+
+def print_report(summary):
+    print(f"\n{summary['flows']['completed']} flows completed, {summary['flows']['failed']} failed "
+          f"in {summary['wall_seconds']}s ({summary['flows_per_second']} flows/s)\n")
+    print(f"{'endpoint':<56}{'count':>7}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in summary["endpoints"].items():
+        print(f"{endpoint:<56}{stats['count']:>7}{stats['errors']:>5}{stats['rps']:>9}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    if summary.get("prompts"):
+        print(f"\n{'prompt [arm]':<56}{'count':>7}{'mean tokens':>14}")
+        for name, stats in summary["prompts"].items():
+            print(f"{name:<56}{stats['count']:>7}{stats['mean_tokens']:>14}")
+
+def compare(baseline, summary, tolerance, floor_ms):
+    # A regression is a percentile that grew by more than `tolerance` and by at least
+    # `floor_ms`, or an error count that went up.
+    print(f"\nCompared with baseline from {baseline['meta']['created_at']}:")
+    regressions = []
+    for endpoint in sorted(set(baseline["endpoints"]) | set(summary["endpoints"])):
+        old, new = baseline["endpoints"].get(endpoint), summary["endpoints"].get(endpoint)
+        if old is None or new is None:
+            print(f"  {endpoint}: {'new endpoint' if old is None else 'missing from this run'}")
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            delta = new[key] - old[key]
+            ratio = delta / old[key] if old[key] else 0.0
+            flag = ""
+            if ratio > tolerance and delta >= floor_ms:
+                flag = " REGRESSION"
+                regressions.append(f"{endpoint} {key}")
+            changes.append(f"{key[:-3]} {old[key]:.1f} -> {new[key]:.1f} ({ratio:+.0%}){flag}")
+        if new["errors"] > old["errors"]:
+            changes.append(f"errors {old['errors']} -> {new['errors']} REGRESSION")
+            regressions.append(f"{endpoint} errors")
+        print(f"  {endpoint}: " + ", ".join(changes))
+    return regressions
+
+# --- SERVER ---
+
+# Spawned multi-worker servers flush their metrics this often (see metrics.py); the
+# prompt stats are read after waiting for one more flush.
+SPAWN_METRICS_FLUSH_SECONDS = 0.5
+
+def spawn_server(args):
+    # Started through serve.py, so several workers get the same environment as in
+    # production: a shared session store, merged /metrics and a single migration.
+    env = dict(os.environ)
+    env.setdefault("LLM_BACKEND", "fake")
+    env["DATABASE_URL"] = args.database_url
+    env.setdefault("API_LOG_LEVEL", "WARNING")
+    env.update({
+        "HOST": "127.0.0.1", "PORT": str(args.port), "WEB_CONCURRENCY": str(args.workers),
+        "AUTO_MIGRATE": "1", "UVICORN_LOG_LEVEL": "warning", "METRICS_FLUSH_SECONDS": str(SPAWN_METRICS_FLUSH_SECONDS),
+    })
+    if args.prompt_compaction:
+        env["PROMPT_COMPACTION"] = args.prompt_compaction
+    server = subprocess.Popen([sys.executable, "serve.py"], env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    base_url = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"serve.py exited with code {server.returncode}")
+        try:
+            requests.get(f"{base_url}/quizzes/1", timeout=2)
+            return server, base_url
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.25)
+    server.terminate()
+    raise RuntimeError("serve.py did not start within 60s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Zhero API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start serve.py (fake LLM unless LLM_BACKEND is set)")
+    parser.add_argument("--database-url", default="sqlite:///./loadtest.db", help="database for --spawn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--flow", choices=sorted(FLOWS), default="session")
+    parser.add_argument("--users", type=int, default=20, help="concurrent users")
+    parser.add_argument("--sessions", type=int, default=3, help="quizzes per user")
+    parser.add_argument("--questions", type=int, default=5, help="questions per quiz")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between answers")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="compare against a saved JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--floor-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--prompt-compaction", choices=["on", "off", "ab"], help="PROMPT_COMPACTION for --spawn")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url.rstrip("/")
+    if args.spawn:
+        server, base_url = spawn_server(args)
+    try:
+        requests.get(f"{base_url}/__secret_seed_command__", timeout=60).raise_for_status()
+        recorder = Recorder()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            for user_index in range(args.users):
+                pool.submit(run_user, user_index, base_url, recorder, args)
+        summary = summarize(recorder, time.perf_counter() - started)
+        if args.spawn and args.workers > 1:
+            # Let every worker write out its last numbers before /metrics merges them.
+            time.sleep(2 * SPAWN_METRICS_FLUSH_SECONDS)
+        summary["prompts"] = prompt_stats(base_url)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print_report(summary)
+    summary["meta"] = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "flow": args.flow, "users": args.users, "sessions": args.sessions, "questions": args.questions,
+        "think_time": args.think_time, "seed": args.seed, "workers": args.workers,
+        "database": (args.database_url if args.spawn else "external").split(":", 1)[0],
+        "llm_backend": os.getenv("LLM_BACKEND", "fake" if args.spawn else "unknown"),
+        "fake_llm": {key: value for key, value in os.environ.items() if key.startswith("FAKE_LLM_")},
+        "prompt_compaction": args.prompt_compaction or os.getenv("PROMPT_COMPACTION", "on"),
+        "python": platform.python_version(),
+    }
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), summary, args.tolerance, args.floor_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): " + "; ".join(regressions))
+            exit_code = 1
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.save}")
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,173 @@
 # main.py
 
+import time
+IMPORT_STARTED = time.perf_counter()
+
 import os
+import asyncio
+import datetime
+import hmac
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
 from dotenv import load_dotenv
-import google.generativeai as genai
 import traceback
-import json
-from typing import List
+import logging
+from typing import Literal
+
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session, selectinload
 
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+# Before the project modules, which read their settings from the environment at import.
+load_dotenv()
 
-import models, schemas
-from database import SessionLocal, engine
+import models, schemas, prompts, prompt_builder, sessions, batch, metrics, analytics
+from database import SessionLocal, engine, query_stats, IS_SQLITE
+from migrate import migrate
+from tracing import span
+from llm import LLMTimeoutError, LLMOverloadedError, has_free_slot
+from llm_router import create_router
+from llm_output import (
+    LLMOutputError, output_snapshot, output_stats, parse_question, parse_recommendations,
+    repair_choice, repair_recommendation,
+)
+from llm_cache import llm_cache, cache_key
+from conversation import answer_turn
+from speculation import speculator, likely_choices, SPECULATION_ENABLED, PREFETCH_ENABLED
+from quiz_cache import quiz_cache, build_response
+from question_selector import question_selector
+from content_loader import load_content
+from sessions import session_store
+from matcher import career_matcher, MATCHER_TOP_K
+from batch import batch_runner, stream_job
+from streaming import sse_from_json_stream, replay_sse, SSE_HEADERS
 
 # --- AI SETUP ---
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemma-3n-e4b-it')
+# gemini: the real API. fake: fake_llm.FakeGenerativeModel, for load tests and local dev.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+# A fast model for next questions and a stronger one for the final analysis, each with
+# a fallback model, latency budget and circuit breakers (see llm_router.py). Built by
+# each worker at startup rather than at import.
+llm_router = question_route = recommendation_route = None
+
+def init_llm():
+    global llm_router, question_route, recommendation_route
+    if LLM_BACKEND != "fake":
+        # google.generativeai alone takes about a second to import.
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    llm_router = create_router(LLM_BACKEND)
+    question_route = llm_router.route("question")
+    recommendation_route = llm_router.route("recommendations")
+
+# --- STARTUP ---
+# Tables are created by migrate.py, the Procfile release step. AUTO_MIGRATE=1 runs it at
+# startup instead; that is the default for a local SQLite file.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1" if IS_SQLITE else "0") == "1"
+# Pooled connections opened before the worker takes traffic.
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", "2"))
+
+# Seconds per phase: import, llm, migrate, db_pool, quiz_cache, question_banks, matcher, startup.
+startup_timings = {}
+worker_ready = False
+
+logging.basicConfig()
+logger = logging.getLogger("zhero.api")
+logger.setLevel(os.getenv("API_LOG_LEVEL", "INFO"))
 
-# --- DATABASE AND APP SETUP ---
-models.Base.metadata.create_all(bind=engine)
-app = FastAPI()
+@contextmanager
+def startup_phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = round(time.perf_counter() - started, 4)
+        metrics.startup_seconds.set(startup_timings[name], phase=name)
+
+def warm_up():
+    # Everything the first requests would otherwise pay for: pooled connections, the quiz
+    # cache (serialized and compressed bodies), the question banks and the career matrix.
+    with startup_phase("db_pool"):
+        connections = [engine.connect() for _ in range(WARMUP_CONNECTIONS)]
+        for connection in connections:
+            connection.execute(text("SELECT 1"))
+            connection.close()
+    db = SessionLocal()
+    try:
+        with startup_phase("quiz_cache"):
+            entries = [quiz_cache.get(db, quiz_id, load_quiz) for quiz_id in db.scalars(select(models.Quiz.id)).all()]
+        with startup_phase("question_banks"):
+            for entry in filter(None, entries):
+                question_selector.bank(entry)
+        with startup_phase("matcher"):
+            career_matcher.refresh(db)
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app):
+    global worker_ready
+    started = time.perf_counter()
+    # Connections inherited from a forking parent (gunicorn --preload) must not be reused.
+    engine.dispose(close=False)
+    with startup_phase("llm"):
+        init_llm()
+    if AUTO_MIGRATE:
+        with startup_phase("migrate"):
+            await asyncio.to_thread(migrate)
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception:
+        # Serve anyway; /readyz reports whether the database is reachable.
+        logger.exception("Warm-up failed")
+    startup_timings["startup"] = round(time.perf_counter() - started, 4)
+    metrics.startup_seconds.set(startup_timings["startup"], phase="startup")
+    logger.info("Worker %d ready: %s", os.getpid(), ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in startup_timings.items()))
+    worker_ready = True
+    # With several workers (serve.py sets METRICS_DIR) /metrics merges every worker's file.
+    flusher = asyncio.create_task(metrics.flush_periodically()) if metrics.METRICS_DIR else None
+    yield
+    worker_ready = False
+    if flusher is not None:
+        flusher.cancel()
+        metrics.write_snapshot()
+    engine.dispose()
+
+# --- APP SETUP ---
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    # Route latency, in-flight requests and per-request DB query count / time, exported
+    # to /metrics, logged, and returned as a Server-Timing header. Streaming responses
+    # are timed until their headers are sent; the LLM spans cover the rest.
+    stats = {"count": 0, "seconds": 0.0}
+    token = query_stats.set(stats)
+    started = time.perf_counter()
+    metrics.http_in_flight.inc()
+    try:
+        with span("http.request", method=request.method, path=request.url.path) as trace:
+            response = await call_next(request)
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            trace.set(route=route, status_code=response.status_code, db_queries=stats["count"], db_ms=round(stats["seconds"] * 1000, 3))
+    finally:
+        metrics.http_in_flight.dec()
+        query_stats.reset(token)
+    elapsed = time.perf_counter() - started
+    metrics.http_requests.inc(method=request.method, route=route, status=response.status_code)
+    metrics.http_request_duration.observe(elapsed, method=request.method, route=route)
+    metrics.db_queries_per_request.observe(stats["count"], route=route)
+    metrics.db_time_per_request.observe(stats["seconds"], route=route)
+    response.headers["Server-Timing"] = f'db;dur={stats["seconds"] * 1000:.1f};desc="{stats["count"]} queries", total;dur={elapsed * 1000:.1f}'
+    if trace.trace_id:
+        response.headers["X-Trace-Id"] = trace.trace_id
+    logger.info(
+        "%s %s -> %s: %d queries, %.1fms db, %.1fms total",
+        request.method, request.url.path, response.status_code, stats["count"], stats["seconds"] * 1000, elapsed * 1000,
+    )
+    return response
 
 def get_db():
     db = SessionLocal()
@@ -30,98 +176,621 @@ def get_db():
     finally:
         db.close()
 
+def overloaded(e):
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+# --- HEALTH ---
+
+@app.get("/healthz")
+def healthz():
+    # Liveness: the process is up and serving.
+    return {"status": "ok"}
+
+def ping_database():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+@app.get("/readyz")
+async def readyz():
+    # Readiness: startup and warm-up are done and the database answers.
+    if not worker_ready:
+        raise HTTPException(status_code=503, detail="Worker is not ready")
+    try:
+        await asyncio.to_thread(ping_database)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {repr(e)}")
+    return {"status": "ready", "pid": os.getpid(), "startup_seconds": startup_timings}
+
 # --- API ENDPOINTS ---
 @app.get("/__secret_seed_command__")
 def secret_seed(db: Session = Depends(get_db)):
-    if db.query(models.Quiz).first():
-        return {"message": "Database already seeded."}
     try:
-        # The full seeding logic from your seed.py file goes here
-        # ...
-        return {"message": "Database seeded successfully."}
+        summary = load_content(db)
+        db.commit()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+    quiz_cache.invalidate()
+    message = "Database seeded successfully." if summary["changed"] else "Database already seeded."
+    return {"message": message, **summary}
 
-@app.get("/quizzes/{quiz_id}", response_model=schemas.Quiz)
-def read_quiz(quiz_id: int, db: Session = Depends(get_db)):
-    quiz = db.query(models.Quiz).options(
-        joinedload(models.Quiz.questions)
-        .joinedload(models.Question.choices)
-        .joinedload(models.Choice.interest_tags)
+def load_quiz(db: Session, quiz_id: int):
+    # selectinload issues one query per level (4 total), so rows grow linearly with
+    # the quiz instead of as questions x choices x tags.
+    return db.query(models.Quiz).options(
+        selectinload(models.Quiz.questions)
+        .selectinload(models.Question.choices)
+        .selectinload(models.Choice.interest_tags)
     ).filter(models.Quiz.id == quiz_id).first()
-    if quiz is None:
+
+@app.get("/quizzes/{quiz_id}", response_model=schemas.Quiz)
+def read_quiz(
+    quiz_id: int,
+    db: Session = Depends(get_db),
+    if_none_match: str | None = Header(default=None),
+    accept_encoding: str | None = Header(default=None),
+):
+    entry = quiz_cache.get(db, quiz_id, load_quiz)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Quiz not found")
-    return quiz
+    return build_response(entry, if_none_match, accept_encoding)
+
+# --- ADAPTIVE QUESTION SELECTION ---
+# Stored questions are scored by expected information gain against the user's tag
+# tally; the LLM is only needed once the bank can't separate their leading tags.
+
+def select_question(quiz_id, asked_question_ids, tag_tally):
+    db = SessionLocal()
+    try:
+        entry = quiz_cache.get(db, quiz_id, load_quiz)
+    finally:
+        db.close()
+    if entry is None:
+        return None
+    return question_selector.bank(entry).select(asked_question_ids, tag_tally)
+
+@app.post("/quizzes/{quiz_id}/next-question")
+def next_quiz_question(quiz_id: int, selection_input: schemas.NextQuestionInput):
+    selection = select_question(quiz_id, selection_input.asked_question_ids, selection_input.tag_tally)
+    if selection is None:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    question, gain = selection
+    # question is None when the client should fall back to /generate-conversational-question.
+    return {"question": question, "expected_gain": round(gain, 4), "use_llm": question is None}
+
+async def cached_question(convo_input, key, prompt=None):
+    prompt = prompt or prompt_builder.question_prompt(convo_input.user_age, convo_input.hobbies, convo_input.conversation_history).text
+
+    async def generate():
+        text = await question_route.generate(prompt, schemas.GeneratedQuestion)
+        return await parse_question(text, question_route.generate)
+
+    return await llm_cache.get_or_generate(key, "question", generate)
 
 @app.post("/generate-conversational-question")
-def generate_conversational_question(convo_input: schemas.ConversationalInput):
-    history = convo_input.conversation_history
-    user_age = convo_input.user_age
-    hobbies = ", ".join(convo_input.hobbies)
-    history_string = "\n".join([f"Q: {turn['question']}\nA: {turn['answer']}" for turn in history])
-    
-    prompt = f"""
-    You are "Zhero," an AI career counselor creating a personalized MCQ quiz for a '{user_age}' whose hobbies include '{hobbies}'.
-    Based on the conversation history, generate the VERY NEXT question.
-    --- CONVERSATION HISTORY ---
-    {history_string}
-    --- END OF HISTORY ---
-    ## RULES:
-    1.  ANALYZE & DEEPEN: Analyze the history to identify emerging interests. Generate a new question that probes deeper into ONE of these interests.
-    2.  CREATE A SCENARIO: The question must be a specific, age-appropriate scenario.
-    3.  GENERATE 4 OPTIONS: Create four distinct, plausible answer options.
-    4.  TAG EACH OPTION: Each option MUST be tagged with one of: ["Analytical & Investigative", "Artistic & Creative", "Social & Helping", "Enterprising & Leading", "Conventional & Organizing", "Realistic & Hands-On"].
-    5.  OUTPUT FORMAT: Respond with a valid JSON object with keys "question" (string) and "choices" (list of dicts). Each choice dict must have keys "text" and "tag".
-    ## EXAMPLE OUTPUT:
-    {{
-      "question": "A community project to build a new park is announced. What role excites you?",
-      "choices": [
-        {{"text": "Researching the best local plants...", "tag": "Analytical & Investigative"}},
-        {{"text": "Designing a beautiful sculpture...", "tag": "Artistic & Creative"}},
-        {{"text": "Organizing volunteer schedules...", "tag": "Social & Helping"}},
-        {{"text": "Building the benches and planting trees...", "tag": "Realistic & Hands-On"}}
-      ]
-    }}
-    Generate the JSON for the next question now.
-    """
-    try:
-        response = model.generate_content(prompt)
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "").strip()
-        return json.loads(cleaned_response)
+async def generate_conversational_question(convo_input: schemas.ConversationalInput):
+    try:
+        key = cache_key("question", question_route.name, convo_input)
+        if SPECULATION_ENABLED:
+            speculated = await speculator.take(key)
+            if speculated is not None:
+                return speculated
+        return await cached_question(convo_input, key)
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except LLMOutputError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except LLMOverloadedError as e:
+        raise overloaded(e)
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"An exception occurred: {repr(e)}")
 
+@app.post("/speculate-next-questions", status_code=202)
+async def speculate_next_questions(spec_input: schemas.SpeculationInput):
+    # Starts generating the follow-up question for the most likely answers to the
+    # question the user is reading now. The follow-up request then picks it up from
+    # the speculation table instead of waiting on the LLM.
+    if not SPECULATION_ENABLED:
+        return {"enabled": False, "scheduled": 0}
+    scheduled = schedule_speculation(spec_input, spec_input.question, spec_input.choices)
+    return {"enabled": True, "scheduled": scheduled}
+
+def schedule_speculation(convo_input, question, choices):
+    parent = cache_key("question", question_route.name, convo_input)
+    scheduled = 0
+    for choice in likely_choices(convo_input.conversation_history, choices):
+        branch_input = schemas.ConversationalInput(
+            conversation_history=[*convo_input.conversation_history, answer_turn(question, choice)],
+            user_age=convo_input.user_age,
+            hobbies=convo_input.hobbies,
+        )
+        key = cache_key("question", question_route.name, branch_input)
+        if speculator.launch(parent, key, cached_question(branch_input, key)):
+            scheduled += 1
+    return scheduled
+
+@app.get("/speculation/stats")
+def speculation_stats():
+    return {**speculator.snapshot(), "worker": os.getpid()}
+
+# --- RECOMMENDATIONS ---
+# llm:    the model picks and explains the careers.
+# fast:   the local matcher ranks careers from the answer tags alone, no model call.
+# hybrid: the matcher picks the careers and the model only writes the reasons.
+# When the model times out, llm and hybrid fall back to the matcher's result.
+
+RECOMMENDATION_MODE = os.getenv("RECOMMENDATION_MODE", "llm")
+RecommendationMode = Literal["llm", "hybrid", "fast"]
+RECOMMENDATION_ITEM_EVENTS = {"recommendations": "recommendation"}
+
+def matched_recommendations(history, top_k=MATCHER_TOP_K):
+    db = SessionLocal()
+    try:
+        return career_matcher.refresh(db).recommend(history, top_k)
+    finally:
+        db.close()
+
+async def matcher_fallback(history):
+    document = await asyncio.to_thread(matched_recommendations, history)
+    return document if document["recommendations"] else None
+
+def recommendation_prompt(user_age, hobbies, history, history_text, matched):
+    careers = [item["career"] for item in matched["recommendations"]] if matched else None
+    return prompt_builder.recommendations_prompt(user_age, hobbies, history, history_text, careers).text
+
+async def build_recommendations(mode, user_age, hobbies, history, history_text, allow_fallback=True):
+    # allow_fallback=False raises instead of answering with the matcher's template
+    # result when the model fails; batch jobs store that as a retryable error.
+    matched = await matcher_fallback(history) if mode != "llm" else None
+    if mode == "fast":
+        return matched or {"recommendations": []}
+    prompt = recommendation_prompt(user_age, hobbies, history, history_text, matched)
+    try:
+        text = await recommendation_route.generate(prompt, schemas.GeneratedRecommendations)
+        document = await parse_recommendations(text, recommendation_route.generate)
+    except (LLMTimeoutError, LLMOutputError, LLMOverloadedError):
+        if not allow_fallback:
+            raise
+        fallback = matched or await matcher_fallback(history)
+        if fallback is None:
+            raise
+        return fallback
+    return merge_reasons(matched, document) if matched else document
+
+def merge_reasons(matched, document):
+    # Hybrid mode keeps the matcher's ranking and scores; the model only words the reasons.
+    reasons = {item.get("career"): item.get("reason") for item in document.get("recommendations", [])}
+    return {"recommendations": [
+        {**item, "reason": reasons.get(item["career"]) or item["reason"]} for item in matched["recommendations"]
+    ]}
+
+class ReasonMerge:
+    # Streams the matched items in rank order, each once the model has written its reason
+    # and everything ranked above it has gone out. Careers the model adds are dropped;
+    # ones it skips keep the matcher's reason when the final document arrives.
+    def __init__(self, matched):
+        self.ranked = matched["recommendations"]
+        self.reasons = {}
+        self.sent = 0
+
+    def item(self, key, value):
+        self.reasons[value["career"]] = value["reason"]
+        ready = []
+        while self.sent < len(self.ranked) and self.ranked[self.sent]["career"] in self.reasons:
+            item = self.ranked[self.sent]
+            ready.append({**item, "reason": self.reasons[item["career"]]})
+            self.sent += 1
+        return ready
+
+    def rest(self, key, document):
+        return document[key][self.sent:]
+
+    def document(self):
+        # The fallback: reasons written so far, the matcher's for the rest.
+        return {"recommendations": [
+            {**item, "reason": self.reasons.get(item["career"]) or item["reason"]} for item in self.ranked
+        ]}
+
+async def stream_recommendations(mode, user_age, hobbies, history, history_text, on_done=None):
+    matched = await matcher_fallback(history) if mode != "llm" else None
+    if mode == "fast":
+        document = matched or {"recommendations": []}
+        if on_done is not None:
+            await on_done(document)
+        return replay_sse(document, RECOMMENDATION_ITEM_EVENTS)
+    prompt = recommendation_prompt(user_age, hobbies, history, history_text, matched)
+    if not matched:
+        return sse_from_json_stream(
+            recommendation_route.stream(prompt, schemas.GeneratedRecommendations), RECOMMENDATION_ITEM_EVENTS,
+            on_done=on_done, fallback=lambda: matcher_fallback(history),
+            repair_item=repair_recommendation, finish=lambda text: parse_recommendations(text, recommendation_route.generate),
+        )
+
+    async def finish(text):
+        return merge_reasons(matched, await parse_recommendations(text, recommendation_route.generate))
+
+    merge = ReasonMerge(matched)
+
+    async def fallback():
+        return merge.document()
+
+    return sse_from_json_stream(
+        recommendation_route.stream(prompt, schemas.GeneratedRecommendations), RECOMMENDATION_ITEM_EVENTS,
+        on_done=on_done, fallback=fallback, repair_item=repair_recommendation, finish=finish, merge=merge,
+    )
+
 @app.post("/generate-ai-recommendations")
-def generate_ai_recommendations(convo_input: schemas.ConversationalInput):
-    history = convo_input.conversation_history
-    user_age = convo_input.user_age
-    hobbies = ", ".join(convo_input.hobbies)
-    history_string = "\n".join([f"Q: {turn['question']}\nA: {turn['answer']}" for turn in history])
-
-    prompt = f"""
-    You are "Zhero," a world-class AI career analyst reviewing an interview with a user who is '{user_age}' and has hobbies like '{hobbies}'.
-    --- FULL INTERVIEW TRANSCRIPT ---
-    {history_string}
-    --- END TRANSCRIPT ---
-    ## RULES:
-    1.  HOLISTIC ANALYSIS: Analyze the conversation to identify core interests, skills, and personality traits.
-    2.  DYNAMIC RECOMMENDATIONS: Suggest 3 to 5 specific career paths or fields of study relevant to the user's unique responses and age.
-    3.  PERSONALIZED REASONING: For each career, provide a "Why it's a good fit for you:" section that directly references the user's answers.
-    4.  OUTPUT FORMAT: Respond with a valid JSON object with a single key "recommendations", which is a list of dicts. Each dict must have keys "career" and "reason".
-    ## EXAMPLE OUTPUT:
-    {{
-      "recommendations": [
-        {{"career": "Urban Planner", "reason": "Why it's a good fit for you: Your detailed answer about designing a community park showed a passion for both creative design and analytical thinking..."}}
-      ]
-    }}
-    Generate the JSON analysis and recommendations now.
-    """
-    try:
-        response = model.generate_content(prompt)
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "").strip()
-        return json.loads(cleaned_response)
+async def generate_ai_recommendations(convo_input: schemas.ConversationalInput, mode: RecommendationMode | None = None):
+    history_text = prompts.format_history(convo_input.conversation_history)
+    try:
+        return await build_recommendations(
+            mode or RECOMMENDATION_MODE, convo_input.user_age, convo_input.hobbies, convo_input.conversation_history, history_text,
+        )
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except LLMOutputError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except LLMOverloadedError as e:
+        raise overloaded(e)
     except Exception as e:
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"An exception occurred: {repr(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An exception occurred: {repr(e)}")
+
+@app.post("/recommendations/fast")
+def fast_recommendations(convo_input: schemas.ConversationalInput, top_k: int = Query(default=MATCHER_TOP_K, ge=1, le=20), db: Session = Depends(get_db)):
+    return career_matcher.refresh(db).recommend(convo_input.conversation_history, top_k)
+
+# --- STREAMING (SSE) VARIANTS ---
+# Each complete choice / recommendation is sent as its own event as soon as the model
+# has finished writing it, followed by a "done" event carrying the whole document.
+
+QUESTION_ITEM_EVENTS = {"choices": "choice"}
+QUESTION_MEMBER_EVENTS = {"question": "question"}
+@app.post("/generate-conversational-question/stream")
+async def stream_conversational_question(convo_input: schemas.ConversationalInput):
+    key = cache_key("question", question_route.name, convo_input)
+    cached = await speculator.take(key) if SPECULATION_ENABLED else None
+    if cached is None:
+        cached = await llm_cache.lookup(key)
+    if cached is not None:
+        events = replay_sse(cached, QUESTION_ITEM_EVENTS, QUESTION_MEMBER_EVENTS)
+    else:
+        try:
+            question_route.check()
+        except LLMOverloadedError as e:
+            raise overloaded(e)
+
+        async def remember(document):
+            await llm_cache.store(key, "question", document)
+
+        events = sse_from_json_stream(
+            question_route.stream(
+                prompt_builder.question_prompt(convo_input.user_age, convo_input.hobbies, convo_input.conversation_history).text,
+                schemas.GeneratedQuestion,
+            ),
+            QUESTION_ITEM_EVENTS, QUESTION_MEMBER_EVENTS, on_done=remember,
+            repair_item=repair_choice, finish=lambda text: parse_question(text, question_route.generate),
+        )
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+@app.post("/generate-ai-recommendations/stream")
+async def stream_ai_recommendations(convo_input: schemas.ConversationalInput, mode: RecommendationMode | None = None):
+    events = await stream_recommendations(
+        mode or RECOMMENDATION_MODE, convo_input.user_age, convo_input.hobbies,
+        convo_input.conversation_history, prompts.format_history(convo_input.conversation_history),
+    )
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+# --- SERVER-SIDE QUIZ SESSIONS ---
+# The client sends only the index of the chosen answer; history, tag tallies and the
+# rendered transcript live in the session store.
+
+def session_convo_input(state):
+    return schemas.ConversationalInput(conversation_history=state["history"], user_age=state["user_age"], hobbies=state["hobbies"])
+
+async def load_session(session_id):
+    state = await asyncio.to_thread(session_store.get, session_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return state
+
+async def save_session(state):
+    await asyncio.to_thread(session_store.put, state["id"], state)
+
+async def record_finished_session(state, mode):
+    try:
+        await asyncio.to_thread(analytics.record_session, state, mode)
+    except Exception:
+        # Losing an analytics row must not cost the user their recommendations.
+        traceback.print_exc()
+
+async def session_llm_question(state):
+    convo_input = session_convo_input(state)
+    key = cache_key("question", question_route.name, convo_input)
+    # Branches exist when SPECULATION_ENABLED is on or the frontend asked for a prefetch.
+    speculated = await speculator.take(key)
+    if speculated is not None:
+        return speculated
+    prompt = prompt_builder.question_prompt(state["user_age"], state["hobbies"], state["history"], state["history_text"]).text
+    return await cached_question(convo_input, key, prompt)
+
+def prefetch_for_session(state):
+    # Starts generating the follow-ups of the current question. Only LLM turns are worth
+    # it: stored questions are picked in well under a millisecond.
+    answered = len(state["history"]) + 1
+    if answered >= state["total_questions"] or not state["bank_exhausted"]:
+        return 0
+    question = state["current_question"]
+    return schedule_speculation(session_convo_input(state), sessions.question_text(question), question["choices"])
+
+def speculate_for_session(state):
+    if SPECULATION_ENABLED:
+        prefetch_for_session(state)
+
+async def advance_session(state):
+    question = None
+    if not state["bank_exhausted"]:
+        selection = await asyncio.to_thread(select_question, state["quiz_id"], state["asked_question_ids"], state["tag_tally"])
+        if selection is None:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        question, _ = selection
+        # Once the bank can't separate the leading tags it won't later on either.
+        state["bank_exhausted"] = question is None
+    if question is None:
+        try:
+            question = await session_llm_question(state)
+        except LLMTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except LLMOutputError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+        except LLMOverloadedError as e:
+            raise overloaded(e)
+        except Exception as e:
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"An exception occurred: {repr(e)}")
+    state["current_question"] = question
+    speculate_for_session(state)
+
+@app.post("/sessions", status_code=201)
+async def create_session(session_input: schemas.SessionCreate):
+    state = sessions.new_session(
+        session_input.user_age,
+        session_input.hobbies,
+        session_input.total_questions,
+        session_input.quiz_id,
+    )
+    await advance_session(state)
+    await save_session(state)
+    return sessions.public_view(state)
+
+@app.post("/sessions/{session_id}/answers")
+async def answer_session_question(session_id: str, answer: schemas.SessionAnswer):
+    state = await load_session(session_id)
+    if sessions.is_complete(state):
+        raise HTTPException(status_code=409, detail="Session is already complete")
+    if not 0 <= answer.choice_index < len(state["current_question"]["choices"]):
+        raise HTTPException(status_code=422, detail="choice_index is out of range")
+    sessions.record_answer(state, answer.choice_index)
+    if not sessions.is_complete(state):
+        # On failure nothing is saved, so the client can simply resend the same answer.
+        await advance_session(state)
+        state["question_number"] += 1
+    await save_session(state)
+    return sessions.public_view(state)
+
+@app.post("/sessions/{session_id}/prefetch", status_code=202)
+async def prefetch_session_question(session_id: str):
+    # Sent by the frontend while the user reads the current question, so the follow-up
+    # is generated by the time they answer. Refused (a no-op) with PREFETCH_ENABLED=0 or
+    # while every LLM slot is busy, so guesses never queue ahead of real requests.
+    # SPECULATION_ENABLED already does the same for every session.
+    if not PREFETCH_ENABLED or not has_free_slot():
+        return {"scheduled": 0}
+    state = await load_session(session_id)
+    if sessions.is_complete(state):
+        return {"scheduled": 0}
+    return {"scheduled": prefetch_for_session(state)}
+
+@app.get("/sessions/{session_id}/recommendations")
+async def session_recommendations(session_id: str, mode: RecommendationMode | None = None):
+    state = await load_session(session_id)
+    mode = mode or RECOMMENDATION_MODE
+    if state["recommendations"] is None:
+        try:
+            state["recommendations"] = await build_recommendations(
+                mode, state["user_age"], state["hobbies"], state["history"], state["history_text"],
+            )
+        except LLMTimeoutError as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except LLMOutputError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+        except LLMOverloadedError as e:
+            raise overloaded(e)
+        except Exception as e:
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"An exception occurred: {repr(e)}")
+        await save_session(state)
+        await record_finished_session(state, mode)
+    return state["recommendations"]
+
+@app.get("/sessions/{session_id}/recommendations/stream")
+async def stream_session_recommendations(session_id: str, mode: RecommendationMode | None = None):
+    state = await load_session(session_id)
+    mode = mode or RECOMMENDATION_MODE
+    if state["recommendations"] is not None:
+        events = replay_sse(state["recommendations"], RECOMMENDATION_ITEM_EVENTS)
+    else:
+        async def remember(document):
+            state["recommendations"] = document
+            await save_session(state)
+            await record_finished_session(state, mode)
+
+        events = await stream_recommendations(
+            mode, state["user_age"], state["hobbies"], state["history"], state["history_text"],
+            on_done=remember,
+        )
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+# --- BATCH SCORING ---
+# Accepts a JSON list (or {"items": [...]}) or an NDJSON upload of ConversationalInput records.
+# Items and results are persisted, so a job can be polled, its results re-read, and an
+# interrupted run resumed by id. Streaming responses are NDJSON in completion order.
+
+def batch_recommender(mode):
+    # No silent matcher fallback: an item the model couldn't answer (shed, timed out,
+    # unusable output) is stored as "error", and resuming the job retries it.
+    async def recommend(convo_input):
+        history = convo_input.conversation_history
+        return await build_recommendations(
+            mode, convo_input.user_age, convo_input.hobbies, history, prompts.format_history(history), allow_fallback=False,
+        )
+    return recommend
+
+async def batch_response(job_id, stream, initial=()):
+    headers = {"X-Batch-Job-Id": job_id}
+    if stream:
+        queue = batch_runner.subscribe(job_id)
+        return StreamingResponse(stream_job(queue, initial), media_type="application/x-ndjson", headers=headers)
+    return JSONResponse(status_code=202, content=await asyncio.to_thread(batch.job_status, job_id), headers=headers)
+
+@app.post("/batch/recommendations")
+async def create_batch(request: Request, mode: RecommendationMode | None = None, stream: bool = True):
+    mode = mode or RECOMMENDATION_MODE
+    try:
+        items = batch.parse_items(await request.body(), request.headers.get("content-type"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job_id = await asyncio.to_thread(batch.create_job, items, mode)
+    await batch_runner.start(job_id, batch_recommender(mode))
+    invalid = [batch.result_line(position, "invalid", error=error) for position, (_, error) in enumerate(items) if error]
+    return await batch_response(job_id, stream, invalid)
+
+@app.get("/batch/jobs/{job_id}")
+async def read_batch_job(job_id: str):
+    status = await asyncio.to_thread(batch.job_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return status
+
+@app.get("/batch/jobs/{job_id}/results")
+async def read_batch_results(job_id: str):
+    if await asyncio.to_thread(batch.job_status, job_id) is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return StreamingResponse(batch.iter_results(job_id), media_type="application/x-ndjson")
+
+@app.post("/batch/jobs/{job_id}/resume")
+async def resume_batch_job(job_id: str, stream: bool = True):
+    status = await asyncio.to_thread(batch.job_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    if not await batch_runner.start(job_id, batch_recommender(status["mode"])):
+        raise HTTPException(status_code=409, detail="Batch job is already running")
+    return await batch_response(job_id, stream)
+
+# --- ANALYTICS ---
+# Finished sessions are recorded by record_finished_session(). The dashboard endpoints
+# read only the rollup tables; the export pages through the sessions themselves.
+
+@app.get("/analytics/summary")
+async def analytics_summary(
+    age_bucket: str | None = None,
+    since: datetime.date | None = None,
+    until: datetime.date | None = None,
+    limit: int = Query(default=10, ge=1, le=100),
+):
+    # age_bucket takes a label ("9-11") or an age ("10"); dates are UTC days, inclusive.
+    try:
+        return await asyncio.to_thread(analytics.summary, age_bucket, since, until, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/analytics/career-tags")
+async def analytics_career_tags(career: str | None = None, tag: str | None = None, limit: int = Query(default=20, ge=1, le=100)):
+    if (career is None) == (tag is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of career or tag")
+    return await asyncio.to_thread(analytics.career_tags, career, tag, limit)
+
+def require_export_token(authorization: str | None = Header(default=None)):
+    if not analytics.ANALYTICS_EXPORT_TOKEN:
+        raise HTTPException(status_code=403, detail="The HTTP export is disabled; use `python analytics.py export`")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), analytics.ANALYTICS_EXPORT_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid export token", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/analytics/export.parquet", dependencies=[Depends(require_export_token)])
+async def analytics_export(since: datetime.date | None = None, until: datetime.date | None = None):
+    # Parquet writes its footer last, so the file is built on disk and then sent.
+    # Millions of sessions are better exported with `python analytics.py export`.
+    handle, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(handle)
+    try:
+        await asyncio.to_thread(analytics.export_parquet, path, since, until)
+    except Exception:
+        os.remove(path)
+        raise
+    filename = f"sessions-{since or 'all'}-{until or 'now'}.parquet"
+    return FileResponse(path, media_type="application/vnd.apache.parquet", filename=filename, background=BackgroundTask(os.remove, path))
+
+# --- METRICS ---
+# Numbers the caches already keep are read at scrape time instead of being duplicated.
+# /metrics covers every worker; the JSON stats endpoints describe the worker that
+# answered, named by its "worker" pid.
+
+@metrics.register_collector
+def cache_metrics():
+    cache = llm_cache.snapshot()
+    speculation = speculator.snapshot()
+    return [
+        ("zhero_llm_cache_lookups_total", "counter", "LLM cache lookups by result.", [
+            ({"result": name}, cache[name]) for name in ("memory_hits", "persistent_hits", "coalesced", "misses")
+        ]),
+        ("zhero_llm_cache_hit_ratio", "gauge", "Share of LLM cache lookups served without a new call.", [({}, cache["hit_rate"])]),
+        ("zhero_llm_cache_entries", "gauge", "Entries in the in-memory LLM cache.", [({}, cache["size"])]),
+        ("zhero_speculation_hit_ratio", "gauge", "Share of follow-up questions served from speculation.", [({}, speculation["hit_rate"])]),
+        ("zhero_speculation_wasted_ratio", "gauge", "Share of speculative generations thrown away.", [({}, speculation["wasted_rate"])]),
+        ("zhero_speculation_branches_total", "counter", "Speculative branches by outcome.", [
+            ({"outcome": name}, speculation[name]) for name in ("launched", "hits", "misses", "cancelled", "expired")
+        ]),
+        ("zhero_llm_output_total", "counter", "Parsed LLM responses by repair outcome.", [
+            ({"result": name}, output_stats[name]) for name in ("responses", "repaired", "reasked", "failed")
+        ]),
+    ]
+
+BREAKER_STATES = ("closed", "half_open", "open")
+
+@metrics.register_collector
+def route_metrics():
+    routes = llm_router.snapshot() if llm_router is not None else {}
+    samples = [(task, entry) for task, route in routes.items() for entry in route["models"]]
+    return [
+        ("zhero_llm_breaker_state", "gauge", "Circuit breaker state per route and model (1 = current state).", [
+            ({"route": task, "model": entry["model"], "state": state}, int(entry["state"] == state))
+            for task, entry in samples for state in BREAKER_STATES
+        ]),
+        ("zhero_llm_route_p95_seconds", "gauge", "Recent p95 latency per route and model.", [
+            ({"route": task, "model": entry["model"]}, entry["p95_seconds"]) for task, entry in samples
+        ]),
+        ("zhero_llm_route_error_ratio", "gauge", "Recent error rate per route and model.", [
+            ({"route": task, "model": entry["model"]}, entry["error_rate"]) for task, entry in samples
+        ]),
+    ]
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/llm-output/stats")
+def llm_output_stats():
+    return {**output_snapshot(), "worker": os.getpid()}
+
+@app.get("/llm-cache/stats")
+def llm_cache_stats():
+    return {**llm_cache.snapshot(), "worker": os.getpid()}
+
+@app.get("/llm/routes")
+def llm_routes():
+    return {"worker": os.getpid(), "routes": llm_router.snapshot() if llm_router is not None else {}}
+
+startup_timings["import"] = round(time.perf_counter() - IMPORT_STARTED, 4)
+metrics.startup_seconds.set(startup_timings["import"], phase="import")
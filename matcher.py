@@ -0,0 +1,97 @@
+# matcher.py
+
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+import models
+from conversation import turn_tag, tag_tally
+from quiz_cache import get_content_version, QUIZ_CACHE_REVALIDATE_SECONDS
+
+# Later answers count slightly more than earlier ones: weight = 1 + RECENCY * turn_index.
+MATCHER_RECENCY_WEIGHT = float(os.getenv("MATCHER_RECENCY_WEIGHT", "0.1"))
+MATCHER_TOP_K = int(os.getenv("MATCHER_TOP_K", "5"))
+
+class CareerMatcher:
+    # Holds the career x tag matrix from the Career / InterestTag tables with L2-normalized
+    # rows, so ranking a user is one matrix-vector product. Reloads when the content
+    # version changes (seed.py / the seed endpoint bump it).
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.checked_at = 0.0
+        # (tag_index, careers, career_tags, matrix), replaced as a whole on reload so
+        # concurrent readers never mix an old matrix with a new tag index.
+        self._index = ({}, [], [], np.zeros((0, 0), dtype=np.float32))
+
+    def refresh(self, db):
+        if self.version is not None and time.monotonic() - self.checked_at < QUIZ_CACHE_REVALIDATE_SECONDS:
+            return self
+        with self._lock:
+            version = get_content_version(db)
+            if version != self.version:
+                self._load(db)
+                self.version = version
+            self.checked_at = time.monotonic()
+        return self
+
+    def _load(self, db):
+        tags = db.execute(select(models.InterestTag.id, models.InterestTag.name).order_by(models.InterestTag.id)).all()
+        careers = db.execute(select(models.Career.id, models.Career.title).order_by(models.Career.id)).all()
+        association = models.career_interest_tag_association
+        pairs = db.execute(select(association.c.career_id, association.c.interest_tag_id)).all()
+
+        tag_column = {tag_id: column for column, (tag_id, _) in enumerate(tags)}
+        career_row = {career_id: row for row, (career_id, _) in enumerate(careers)}
+        matrix = np.zeros((len(careers), len(tags)), dtype=np.float32)
+        career_tags = [[] for _ in careers]
+        for career_id, tag_id in pairs:
+            if career_id in career_row and tag_id in tag_column:
+                matrix[career_row[career_id], tag_column[tag_id]] = 1.0
+                career_tags[career_row[career_id]].append(tags[tag_column[tag_id]][1])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+
+        tag_index = {name: column for column, (_, name) in enumerate(tags)}
+        self._index = (tag_index, [title for _, title in careers], career_tags, matrix)
+
+    @staticmethod
+    def tag_vector(tag_index, history):
+        vector = np.zeros(len(tag_index), dtype=np.float32)
+        for turn_index, turn in enumerate(history):
+            column = tag_index.get(turn_tag(turn))
+            if column is not None:
+                vector[column] += 1.0 + MATCHER_RECENCY_WEIGHT * turn_index
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def rank(self, history, top_k=MATCHER_TOP_K):
+        tag_index, careers, career_tags, matrix = self._index
+        vector = self.tag_vector(tag_index, history)
+        if not careers or not vector.any():
+            return []
+        scores = matrix @ vector
+        top_k = min(top_k, len(careers))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [{"career": careers[i], "score": float(scores[i]), "tags": career_tags[i]} for i in top if scores[i] > 0]
+
+    def recommend(self, history, top_k=MATCHER_TOP_K):
+        # Ranked careers with a template "reason", for the fast path and LLM fallback.
+        tally = tag_tally(history)
+        recommendations = []
+        for match in self.rank(history, top_k):
+            shared = sorted((tag for tag in match["tags"] if tag in tally), key=lambda tag: -tally[tag])
+            traits = " and ".join(shared[:2]) or "your interests"
+            recommendations.append({
+                "career": match["career"],
+                "reason": f"Why it's a good fit for you: Your answers leaned strongly towards {traits}, which this career is built on.",
+                "score": round(match["score"], 4),
+            })
+        return {"recommendations": recommendations}
+
+career_matcher = CareerMatcher()
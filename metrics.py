@@ -0,0 +1,213 @@
+# metrics.py
+
+import asyncio
+import glob
+import json
+import os
+import threading
+
+# A small in-process registry rendered in the Prometheus text format (0.0.4).
+#
+# With several workers behind one port a scrape reaches a random one, so serve.py sets
+# METRICS_DIR: every worker then writes its samples to METRICS_DIR/<pid>.json (on each
+# scrape and every METRICS_FLUSH_SECONDS) and /metrics merges all the files. Counters
+# and histograms are summed, including those of workers that have exited, so totals
+# never go backwards; gauges get a "worker" label and disappear with their worker.
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (100, 300, 1000, 3000, 10000, 30000, 100000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+TOKEN_BUCKETS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000)
+
+_registry = []
+_collectors = []
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def family(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        samples = [sample for key, value in items for sample in self._samples(list(zip(self.labelnames, key)), value)]
+        return (self.name, self.kind, self.documentation, samples)
+
+    def _samples(self, labels, value):
+        # [(suffix, [(label, value), ...], value), ...]
+        return [("", labels, value)]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self, labels, value):
+        counts, total, count = value
+        samples = [("_bucket", labels + [("le", _format_value(bound))], bucket_count) for bound, bucket_count in zip(self.buckets, counts)]
+        samples.append(("_sum", labels, total))
+        samples.append(("_count", labels, count))
+        return samples
+
+def register_collector(collect):
+    # `collect()` returns [(name, kind, documentation, [(labels_dict, value), ...]), ...]
+    # and is called on every scrape, for numbers other modules already keep.
+    _collectors.append(collect)
+    return collect
+
+def families():
+    result = [metric.family() for metric in _registry]
+    for collect in _collectors:
+        for name, kind, documentation, samples in collect():
+            result.append((name, kind, documentation, [("", list(labels.items()), value) for labels, value in samples]))
+    return result
+
+def render():
+    found = merged_families() if METRICS_DIR else families()
+    lines = []
+    for name, kind, documentation, samples in found:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# --- MULTI-WORKER ---
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+def write_snapshot():
+    path = _snapshot_path(os.getpid())
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(families(), f)
+    os.replace(path + ".tmp", path)
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def merged_families():
+    write_snapshot()
+    merged = {}
+    for path in sorted(glob.glob(os.path.join(METRICS_DIR, "*.json"))):
+        pid = int(os.path.basename(path)[:-len(".json")])
+        try:
+            with open(path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = _alive(pid)
+        for name, kind, documentation, samples in snapshot:
+            family = merged.setdefault(name, (kind, documentation, {}))[2]
+            for suffix, labels, value in samples:
+                labels = [tuple(pair) for pair in labels]
+                if kind == "gauge":
+                    if not alive:
+                        continue
+                    labels.append(("worker", str(pid)))
+                key = (suffix, tuple(labels))
+                family[key] = family.get(key, 0) + value
+    return [
+        (name, kind, documentation, [(suffix, list(labels), value) for (suffix, labels), value in samples.items()])
+        for name, (kind, documentation, samples) in merged.items()
+    ]
+
+async def flush_periodically():
+    # Keeps this worker's file fresh for scrapes that land on another worker.
+    while True:
+        await asyncio.to_thread(write_snapshot)
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
+
+# --- PROCESS ---
+startup_seconds = Gauge("zhero_startup_seconds", "Worker import and startup time by phase.", ("phase",))
+
+# --- HTTP ---
+http_requests = Counter("zhero_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_request_duration = Histogram("zhero_http_request_duration_seconds", "Time until the response starts, by route.", ("method", "route"))
+http_in_flight = Gauge("zhero_http_requests_in_flight", "Requests currently being handled.")
+
+# --- DATABASE ---
+db_queries_per_request = Histogram("zhero_db_queries_per_request", "SQL statements executed per request.", ("route",), COUNT_BUCKETS)
+db_time_per_request = Histogram("zhero_db_time_per_request_seconds", "Time spent in SQL per request.", ("route",))
+
+# --- LLM ---
+llm_shed = Counter("zhero_llm_shed_total", "LLM calls rejected by admission control or open circuit breakers.", ("reason",))
+llm_failovers = Counter("zhero_llm_failovers_total", "Calls moved to the next model of a route after a failure.", ("route", "model"))
+llm_calls = Counter("zhero_llm_calls_total", "LLM calls by mode (generate / stream) and outcome.", ("mode", "outcome"))
+llm_time_to_first_token = Histogram("zhero_llm_time_to_first_token_seconds", "Time until the first response text arrived.", ("mode",))
+llm_total_time = Histogram("zhero_llm_total_seconds", "Time until the response was complete, retries included.", ("mode",))
+llm_prompt_chars = Histogram("zhero_llm_prompt_chars", "Prompt size in characters.", ("mode",), SIZE_BUCKETS)
+llm_response_chars = Histogram("zhero_llm_response_chars", "Response size in characters.", ("mode",), SIZE_BUCKETS)
+llm_tokens = Counter("zhero_llm_tokens_total", "Tokens reported by the model (or estimated at 4 chars/token).", ("mode", "direction"))
+
+# --- PROMPTS ---
+prompt_tokens = Histogram("zhero_prompt_tokens", "Estimated prompt tokens by prompt kind and compaction arm.", ("kind", "arm"), TOKEN_BUCKETS)
+prompt_compactions = Counter("zhero_prompt_compactions_total", "Prompts whose older turns were summarized to fit the token budget.", ("kind",))
+
+# --- ANALYTICS ---
+analytics_sessions = Counter("zhero_analytics_sessions_total", "Finished sessions written to the analytics tables, by result.", ("result",))
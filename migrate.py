@@ -0,0 +1,26 @@
+# migrate.py
+#
+# Creates missing tables. Runs once per deploy (the Procfile release step) instead of in
+# every worker's import path:
+#
+#   python migrate.py
+#
+# create_all only adds tables that don't exist yet; it never alters existing ones.
+
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import engine, DATABASE_URL
+import models
+
+def migrate():
+    started = time.perf_counter()
+    models.Base.metadata.create_all(bind=engine)
+    return time.perf_counter() - started
+
+if __name__ == "__main__":
+    seconds = migrate()
+    print(f"Schema is up to date on {DATABASE_URL.split(':', 1)[0]} ({seconds:.2f}s).")
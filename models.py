@@ -1,6 +1,6 @@
 # models.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, ForeignKey, Table, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -19,7 +19,7 @@ class Quiz(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(String)
-    questions = relationship("Question", back_populates="quiz")
+    questions = relationship("Question", back_populates="quiz", order_by="Question.id")
 
 class Question(Base):
     __tablename__ = "questions"
@@ -27,7 +27,7 @@ class Question(Base):
     text = Column(String)
     quiz_id = Column(Integer, ForeignKey("quizzes.id"))
     quiz = relationship("Quiz", back_populates="questions")
-    choices = relationship("Choice", back_populates="question")
+    choices = relationship("Choice", back_populates="question", order_by="Choice.id")
 
 class Choice(Base):
     __tablename__ = "choices"
@@ -47,4 +47,98 @@ class Career(Base):
 class InterestTag(Base):
     __tablename__ = "interest_tags"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, unique=True, index=True)
\ No newline at end of file
+    name = Column(String, unique=True, index=True)
+
+class ContentVersion(Base):
+    __tablename__ = "content_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ContentHash(Base):
+    __tablename__ = "content_hashes"
+    kind = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    hash = Column(String(64), nullable=False)
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache_entries"
+    key = Column(String(64), primary_key=True)
+    kind = Column(String, index=True)
+    value = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+class QuizSession(Base):
+    __tablename__ = "quiz_sessions"
+    id = Column(String(32), primary_key=True)
+    data = Column(Text, nullable=False)
+    updated_at = Column(DateTime, nullable=False, index=True)
+
+class BatchJob(Base):
+    __tablename__ = "batch_jobs"
+    id = Column(String(32), primary_key=True)
+    status = Column(String, nullable=False)
+    mode = Column(String, nullable=False)
+    total = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+class BatchItem(Base):
+    __tablename__ = "batch_items"
+    job_id = Column(String(32), ForeignKey("batch_jobs.id"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    input_hash = Column(String(64), nullable=False)
+    input = Column(Text, nullable=False)
+    status = Column(String, nullable=False)
+    result = Column(Text)
+    error = Column(Text)
+    __table_args__ = (Index("ix_batch_items_job_status", "job_id", "status"),)
+
+# --- ANALYTICS ---
+# One row per finished session, plus counters that analytics.py bumps in the same
+# transaction, so dashboards read a row per bucket instead of scanning sessions.
+
+class CompletedSession(Base):
+    __tablename__ = "completed_sessions"
+    id = Column(String(32), primary_key=True)
+    completed_at = Column(DateTime, nullable=False)
+    age_bucket = Column(String, nullable=False)
+    user_age = Column(String)
+    quiz_id = Column(Integer)
+    mode = Column(String)
+    # JSON: normalized hobbies, [{question, answer, tag}] and recommended career names.
+    hobbies = Column(Text, nullable=False)
+    answers = Column(Text, nullable=False)
+    careers = Column(Text, nullable=False)
+    # The export pages through sessions in this order.
+    __table_args__ = (Index("ix_completed_sessions_completed_at_id", "completed_at", "id"),)
+
+class SessionDailyRollup(Base):
+    __tablename__ = "session_daily_rollups"
+    day = Column(Date, primary_key=True)
+    age_bucket = Column(String, primary_key=True)
+    sessions = Column(Integer, nullable=False)
+    answers = Column(Integer, nullable=False)
+
+class TagDailyRollup(Base):
+    __tablename__ = "tag_daily_rollups"
+    day = Column(Date, primary_key=True)
+    age_bucket = Column(String, primary_key=True)
+    tag = Column(String, primary_key=True)
+    # Answers with this tag, and sessions with at least one of them.
+    answers = Column(Integer, nullable=False)
+    sessions = Column(Integer, nullable=False)
+
+class CareerDailyRollup(Base):
+    __tablename__ = "career_daily_rollups"
+    day = Column(Date, primary_key=True)
+    age_bucket = Column(String, primary_key=True)
+    career = Column(String, primary_key=True)
+    sessions = Column(Integer, nullable=False)
+
+class CareerTagRollup(Base):
+    __tablename__ = "career_tag_rollups"
+    career = Column(String, primary_key=True)
+    tag = Column(String, primary_key=True)
+    # Sessions recommended this career that picked the tag, and how often they picked it.
+    sessions = Column(Integer, nullable=False)
+    answers = Column(Integer, nullable=False)
@@ -0,0 +1,193 @@
+# prompt_ab.py
+#
+# A/B of prompt compaction (prompt_builder.py): the same quizzes are sent once with the
+# full transcript and once compacted, and the two arms are compared on prompt size,
+# latency, output failures and how well their answers agree.
+#
+#   python prompt_ab.py                                  # fake LLM, 40 synthetic 20-turn quizzes
+#   python prompt_ab.py --turns 12 --quizzes 100 --save benchmarks/prompt-ab.json
+#   LLM_BACKEND=gemini python prompt_ab.py --transcripts inputs.jsonl
+#
+# --transcripts takes the NDJSON batch format (ConversationalInput per line), e.g. real
+# finished quizzes, which is what a quality comparison against Gemini should use. The
+# synthetic quizzes come from the fake LLM's questions, answered by users who lean
+# towards two interest tags.
+#
+# Per quiz and arm: the next question and the recommendations.
+#   on_profile    share of the next question's choices tagged with one of the user's top
+#                 two tags (the prompt asks it to probe an emerging interest)
+#   tag_overlap   Jaccard of the two arms' choice tags for the same quiz
+#   career_overlap  Jaccard of the two arms' recommended careers
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import fake_llm
+import prompt_builder
+from conversation import ALLOWED_TAGS, answer_turn, tag_tally
+from llm import LLMOverloadedError, LLMTimeoutError
+from llm_output import LLMOutputError, parse_question, parse_recommendations
+from llm_router import create_router
+from loadtest import AGES, HOBBIES
+from schemas import GeneratedQuestion, GeneratedRecommendations
+
+# --- QUIZZES ---
+
+def synthetic_quiz(rng, turns):
+    favourites = rng.sample(ALLOWED_TAGS, 2)
+    history = []
+    for turn in range(turns):
+        question = fake_llm.fake_question(f"{rng.random()}:{turn}")
+        preferred = [choice for choice in question["choices"] if choice["tag"] in favourites]
+        choice = rng.choice(preferred if preferred and rng.random() < 0.7 else question["choices"])
+        history.append(answer_turn(question["question"], choice))
+    return {"user_age": rng.choice(AGES), "hobbies": rng.sample(HOBBIES, rng.randint(0, 3)), "conversation_history": history}
+
+def load_transcripts(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# --- ARMS ---
+
+async def timed_call(build, generate, parse):
+    prompt = build()
+    started = time.perf_counter()
+    try:
+        document = await parse(await generate(prompt.text))
+        error = None
+    except (LLMTimeoutError, LLMOutputError, LLMOverloadedError) as e:
+        document, error = None, type(e).__name__
+    return {"tokens": prompt.tokens, "full_tokens": prompt.full_tokens, "summarized_turns": prompt.summarized_turns,
+            "seconds": time.perf_counter() - started, "document": document, "error": error}
+
+async def run_arm(router, quiz, arm):
+    question_route, recommendation_route = router.route("question"), router.route("recommendations")
+    age, hobbies, history = quiz["user_age"], quiz["hobbies"], quiz["conversation_history"]
+    question = await timed_call(
+        lambda: prompt_builder.question_prompt(age, hobbies, history, arm=arm),
+        lambda prompt: question_route.generate(prompt, GeneratedQuestion),
+        lambda text: parse_question(text, question_route.generate),
+    )
+    recommendations = await timed_call(
+        lambda: prompt_builder.recommendations_prompt(age, hobbies, history, arm=arm),
+        lambda prompt: recommendation_route.generate(prompt, GeneratedRecommendations),
+        lambda text: parse_recommendations(text, recommendation_route.generate),
+    )
+    return {"question": question, "recommendations": recommendations}
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+def score(quiz, arms):
+    top_tags = {tag for tag, _ in tag_tally(quiz["conversation_history"]).most_common(2)}
+    scores = {}
+    for arm, result in arms.items():
+        question = result["question"]["document"]
+        tags = [choice["tag"] for choice in question["choices"]] if question else []
+        scores[arm] = {"on_profile": sum(tag in top_tags for tag in tags) / len(tags) if tags else None}
+    questions = [arms[arm]["question"]["document"] for arm in prompt_builder.ARMS]
+    careers = [arms[arm]["recommendations"]["document"] for arm in prompt_builder.ARMS]
+    return {
+        "arms": scores,
+        "tag_overlap": jaccard(*({c["tag"] for c in q["choices"]} for q in questions)) if all(questions) else None,
+        "career_overlap": jaccard(*({r["career"].lower() for r in d["recommendations"]} for d in careers)) if all(careers) else None,
+    }
+
+# --- REPORTING ---
+
+def mean(values):
+    values = [value for value in values if value is not None]
+    return round(sum(values) / len(values), 3) if values else None
+
+def p95(values):
+    values = sorted(values)
+    return values[max(0, math.ceil(0.95 * len(values)) - 1)] if values else None
+
+def summarize(results):
+    summary = {"quizzes": len(results), "arms": {}}
+    for arm in prompt_builder.ARMS:
+        arm_summary = {}
+        for task in ("question", "recommendations"):
+            calls = [result["arms"][arm][task] for result in results]
+            arm_summary[task] = {
+                "mean_tokens": mean([call["tokens"] for call in calls]),
+                "p95_tokens": p95([call["tokens"] for call in calls]),
+                "compacted": sum(1 for call in calls if call["summarized_turns"]),
+                "mean_ms": mean([call["seconds"] * 1000 for call in calls]),
+                "p95_ms": round(p95([call["seconds"] * 1000 for call in calls]), 2),
+                "errors": sum(1 for call in calls if call["error"]),
+            }
+        arm_summary["question"]["on_profile"] = mean([result["scores"]["arms"][arm]["on_profile"] for result in results])
+        summary["arms"][arm] = arm_summary
+    summary["tag_overlap"] = mean([result["scores"]["tag_overlap"] for result in results])
+    summary["career_overlap"] = mean([result["scores"]["career_overlap"] for result in results])
+    return summary
+
+def print_report(summary):
+    print(f"\n{summary['quizzes']} quizzes\n")
+    print(f"{'arm':<10}{'task':<17}{'tokens':>8}{'p95 tok':>9}{'compacted':>11}{'mean ms':>10}{'p95 ms':>10}{'errors':>8}{'on_profile':>12}")
+    for arm, tasks in summary["arms"].items():
+        for task, stats in tasks.items():
+            on_profile = stats.get("on_profile")
+            print(f"{arm:<10}{task:<17}{stats['mean_tokens']:>8}{stats['p95_tokens']:>9}{stats['compacted']:>11}"
+                  f"{stats['mean_ms']:>10}{stats['p95_ms']:>10}{stats['errors']:>8}{'' if on_profile is None else on_profile:>12}")
+    print(f"\nnext-question tag overlap between arms: {summary['tag_overlap']}")
+    print(f"recommended career overlap between arms: {summary['career_overlap']}")
+
+# --- MAIN ---
+
+async def run(args, quizzes):
+    router = create_router()
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def one(quiz):
+        async with limit:
+            arms = {arm: await run_arm(router, quiz, arm) for arm in prompt_builder.ARMS}
+        return {"arms": arms, "scores": score(quiz, arms)}
+
+    return await asyncio.gather(*(one(quiz) for quiz in quizzes))
+
+def main():
+    parser = argparse.ArgumentParser(description="A/B prompt compaction against the full transcript.")
+    parser.add_argument("--transcripts", help="NDJSON of ConversationalInput records (default: synthetic quizzes)")
+    parser.add_argument("--quizzes", type=int, default=40, help="synthetic quizzes")
+    parser.add_argument("--turns", type=int, default=20, help="answers per synthetic quiz")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the summary as JSON")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if os.environ["LLM_BACKEND"] != "fake":
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    rng = random.Random(args.seed)
+    quizzes = load_transcripts(args.transcripts) if args.transcripts else [synthetic_quiz(rng, args.turns) for _ in range(args.quizzes)]
+
+    summary = summarize(asyncio.run(run(args, quizzes)))
+    summary["meta"] = {
+        "llm_backend": os.environ["LLM_BACKEND"],
+        "transcripts": args.transcripts or f"synthetic:{args.quizzes}x{args.turns}",
+        "seed": args.seed,
+        "prompt_token_budget": prompt_builder.PROMPT_TOKEN_BUDGET,
+        "prompt_keep_turns": prompt_builder.PROMPT_KEEP_TURNS,
+        "fake_llm": {key: value for key, value in os.environ.items() if key.startswith("FAKE_LLM_")},
+    }
+    print_report(summary)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+            f.write("\n")
+        print(f"\nSummary written to {args.save}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# prompt_builder.py
+
+import hashlib
+import os
+import re
+from collections import Counter
+from functools import partial
+from typing import NamedTuple
+
+import metrics
+import prompts
+from conversation import age_bucket, normalize_hobbies, tag_tally
+from tracing import span
+
+# Long quizzes (20 questions) would otherwise send every question and answer verbatim
+# on every turn. Once a prompt is over PROMPT_TOKEN_BUDGET, older turns are replaced by
+# a summary (tag tallies, recurring themes, topics already covered) and only the last
+# PROMPT_KEEP_TURNS turns stay verbatim, fewer if that is still over the budget.
+#   on   compact prompts over the budget
+#   off  always send the full transcript
+#   ab   split users 50/50 between the two by a hash of age bucket + hobbies
+PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "on")
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "900"))
+PROMPT_KEEP_TURNS = int(os.getenv("PROMPT_KEEP_TURNS", "4"))
+PROMPT_THEMES = int(os.getenv("PROMPT_THEMES", "8"))
+
+ARMS = ("compact", "full")
+
+_WORD = re.compile(r"[a-z][a-z'-]{3,}")
+_TAG_SUFFIX = re.compile(r"\s*\([^()]*\)\s*$")
+_STOPWORDS = frozenset("""
+    about after again also always another anything around because been before being best both
+    could does doing done each else even every from have having here into just like love make
+    more most much must need never only other over really same should some something than that
+    their them then there these they thing things this those through very want what when where
+    which while will with would your you're yours enjoy enjoying favorite favourite prefer
+    rather choose pick option scenario what's whats imagine
+""".split())
+
+class BuiltPrompt(NamedTuple):
+    text: str
+    tokens: int
+    # Estimated tokens of the same prompt with the full transcript.
+    full_tokens: int
+    arm: str
+    summarized_turns: int
+
+def estimate_tokens(text):
+    # Same ~4 chars/token estimate llm.py uses when the model reports no usage.
+    return len(text) // 4
+
+def prompt_arm(user_age, hobbies):
+    if PROMPT_COMPACTION == "off":
+        return "full"
+    if PROMPT_COMPACTION != "ab":
+        return "compact"
+    # Stable per user, so a whole quiz (and its cache entries) stays in one arm.
+    user = f"{age_bucket(user_age)}|{','.join(normalize_hobbies(hobbies))}"
+    return ARMS[hashlib.sha256(user.encode("utf-8")).digest()[0] % 2]
+
+def _keywords(texts, limit):
+    # Words that come up in at least two different turns, most frequent first.
+    counts = Counter()
+    for text in texts:
+        counts.update({word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS})
+    return [word for word, count in counts.most_common() if count >= 2][:limit]
+
+def summarize_history(history, recent):
+    older, latest = history[:-recent], history[-recent:]
+    return prompts.render_history_summary(
+        turns=len(older),
+        tag_counts=tag_tally(older).most_common(),
+        themes=_keywords([_TAG_SUFFIX.sub("", turn["answer"]) for turn in older], PROMPT_THEMES),
+        topics=_keywords([turn["question"] for turn in older], PROMPT_THEMES),
+        recent_history_string=prompts.format_history(latest),
+        recent=len(latest),
+    )
+
+def build(kind, render, history, history_text=None, arm="compact"):
+    # `render(history_string)` renders the prompt; `history_text` is the full transcript
+    # when the caller already has it (sessions keep it up to date turn by turn).
+    with span("prompt.build", kind=kind, arm=arm, turns=len(history)) as s:
+        text = full_text = render(prompts.format_history(history) if history_text is None else history_text)
+        tokens = full_tokens = estimate_tokens(text)
+        summarized = 0
+        if arm == "compact" and tokens > PROMPT_TOKEN_BUDGET:
+            for recent in range(min(PROMPT_KEEP_TURNS, len(history) - 1), 0, -1):
+                text = render(summarize_history(history, recent))
+                tokens, summarized = estimate_tokens(text), len(history) - recent
+                if tokens <= PROMPT_TOKEN_BUDGET:
+                    break
+            if tokens >= full_tokens:
+                # A few long turns can summarize to more than they were.
+                text, tokens, summarized = full_text, full_tokens, 0
+            if summarized:
+                metrics.prompt_compactions.inc(kind=kind)
+        metrics.prompt_tokens.observe(tokens, kind=kind, arm=arm)
+        s.set(tokens=tokens, full_tokens=full_tokens, summarized_turns=summarized)
+    return BuiltPrompt(text, tokens, full_tokens, arm, summarized)
+
+def question_prompt(user_age, hobbies, history, history_text=None, arm=None):
+    render = partial(prompts.render_question_prompt, user_age, hobbies)
+    return build("question", render, history, history_text, arm or prompt_arm(user_age, hobbies))
+
+def recommendations_prompt(user_age, hobbies, history, history_text=None, careers=None, arm=None):
+    if careers:
+        render = lambda history_string: prompts.render_reasons_prompt(user_age, hobbies, history_string, careers)
+        kind = "reasons"
+    else:
+        render = partial(prompts.render_recommendations_prompt, user_age, hobbies)
+        kind = "recommendations"
+    return build(kind, render, history, history_text, arm or prompt_arm(user_age, hobbies))
@@ -0,0 +1,129 @@
+# prompts.py
+
+from jinja2 import Environment, StrictUndefined
+
+# Templates are compiled once, at import, and only rendered per request. Autoescaping
+# is off because the output is a prompt, not HTML.
+_env = Environment(autoescape=False, keep_trailing_newline=True, undefined=StrictUndefined)
+
+def _template(source):
+    return _env.from_string(source)
+
+def format_history(history):
+    return "\n".join([f"Q: {turn['question']}\nA: {turn['answer']}" for turn in history])
+
+# prompt_builder.py picks the history_string (full transcript or compacted) and renders these.
+
+_QUESTION = _template("""
+    You are "Zhero," an AI career counselor creating a personalized MCQ quiz for a '{{ user_age }}' whose hobbies include '{{ hobbies }}'.
+    Based on the conversation history, generate the VERY NEXT question.
+    --- CONVERSATION HISTORY ---
+    {{ history_string }}
+    --- END OF HISTORY ---
+    ## RULES:
+    1.  ANALYZE & DEEPEN: Analyze the history to identify emerging interests. Generate a new question that probes deeper into ONE of these interests.
+    2.  CREATE A SCENARIO: The question must be a specific, age-appropriate scenario.
+    3.  GENERATE 4 OPTIONS: Create four distinct, plausible answer options.
+    4.  TAG EACH OPTION: Each option MUST be tagged with one of: ["Analytical & Investigative", "Artistic & Creative", "Social & Helping", "Enterprising & Leading", "Conventional & Organizing", "Realistic & Hands-On"].
+    5.  OUTPUT FORMAT: Respond with a valid JSON object with keys "question" (string) and "choices" (list of dicts). Each choice dict must have keys "text" and "tag".
+    ## EXAMPLE OUTPUT:{% raw %}
+    {
+      "question": "A community project to build a new park is announced. What role excites you?",
+      "choices": [
+        {"text": "Researching the best local plants...", "tag": "Analytical & Investigative"},
+        {"text": "Designing a beautiful sculpture...", "tag": "Artistic & Creative"},
+        {"text": "Organizing volunteer schedules...", "tag": "Social & Helping"},
+        {"text": "Building the benches and planting trees...", "tag": "Realistic & Hands-On"}
+      ]
+    }{% endraw %}
+    Generate the JSON for the next question now.
+    """)
+
+def render_question_prompt(user_age, hobbies, history_string):
+    hobbies = ", ".join(hobbies)
+    return _QUESTION.render(user_age=user_age, hobbies=hobbies, history_string=history_string)
+
+_RECOMMENDATIONS = _template("""
+    You are "Zhero," a world-class AI career analyst reviewing an interview with a user who is '{{ user_age }}' and has hobbies like '{{ hobbies }}'.
+    --- FULL INTERVIEW TRANSCRIPT ---
+    {{ history_string }}
+    --- END TRANSCRIPT ---
+    ## RULES:
+    1.  HOLISTIC ANALYSIS: Analyze the conversation to identify core interests, skills, and personality traits.
+    2.  DYNAMIC RECOMMENDATIONS: Suggest 3 to 5 specific career paths or fields of study relevant to the user's unique responses and age.
+    3.  PERSONALIZED REASONING: For each career, provide a "Why it's a good fit for you:" section that directly references the user's answers.
+    4.  OUTPUT FORMAT: Respond with a valid JSON object with a single key "recommendations", which is a list of dicts. Each dict must have keys "career" and "reason".
+    ## EXAMPLE OUTPUT:{% raw %}
+    {
+      "recommendations": [
+        {"career": "Urban Planner", "reason": "Why it's a good fit for you: Your detailed answer about designing a community park showed a passion for both creative design and analytical thinking..."}
+      ]
+    }{% endraw %}
+    Generate the JSON analysis and recommendations now.
+    """)
+
+def render_recommendations_prompt(user_age, hobbies, history_string):
+    hobbies = ", ".join(hobbies)
+    return _RECOMMENDATIONS.render(user_age=user_age, hobbies=hobbies, history_string=history_string)
+
+_REASONS = _template("""
+    You are "Zhero," a world-class AI career analyst reviewing an interview with a user who is '{{ user_age }}' and has hobbies like '{{ hobbies }}'.
+    --- FULL INTERVIEW TRANSCRIPT ---
+    {{ history_string }}
+    --- END TRANSCRIPT ---
+    Our matching engine has already chosen these careers for the user:
+{{ career_list }}
+    ## RULES:
+    1.  KEEP THE LIST: Write about exactly these careers, in this order. Do not add, remove or rename any.
+    2.  PERSONALIZED REASONING: For each career, provide a "Why it's a good fit for you:" section that directly references the user's answers.
+    3.  OUTPUT FORMAT: Respond with a valid JSON object with a single key "recommendations", which is a list of dicts. Each dict must have keys "career" and "reason".
+    Generate the JSON now.
+    """)
+
+def render_reasons_prompt(user_age, hobbies, history_string, careers):
+    hobbies = ", ".join(hobbies)
+    career_list = "\n".join(f"    - {career}" for career in careers)
+    return _REASONS.render(user_age=user_age, hobbies=hobbies, history_string=history_string, career_list=career_list)
+
+# Older turns of a long quiz, compacted by prompt_builder.py. Goes in place of the
+# history_string above, followed by the most recent turns verbatim.
+
+_HISTORY_SUMMARY = _template("""[Summary of answers 1-{{ turns }}]
+Interest tags picked: {{ tags }}
+{% if themes %}Recurring themes in those answers: {{ themes }}
+{% endif %}{% if topics %}Topics already asked about: {{ topics }}
+{% endif %}[Answers {{ turns + 1 }}-{{ turns + recent }}, verbatim]
+""")
+
+def render_history_summary(turns, tag_counts, themes, topics, recent_history_string, recent):
+    tags = ", ".join(f"{tag} x{count}" for tag, count in tag_counts) or "none"
+    summary = _HISTORY_SUMMARY.render(
+        turns=turns, tags=tags, themes=", ".join(themes), topics=", ".join(topics), recent=recent,
+    )
+    return summary + recent_history_string
+
+# Targeted re-asks used by llm_output.py when a response can't be repaired locally.
+
+_JSON_FIX = _template("""
+    The text below was meant to be a single JSON object matching this JSON schema:
+    {{ schema }}
+    --- TEXT ---
+    {{ raw_output }}
+    --- END TEXT ---
+    Rewrite it as valid JSON matching the schema. Keep the content; only fix the format.
+    Respond with the JSON object only.
+    """)
+
+def render_json_fix_prompt(raw_output, schema):
+    return _JSON_FIX.render(raw_output=raw_output, schema=schema)
+
+_RETAG = _template("""
+    Quiz question: "{{ question }}"
+    Tag each of these answer options with exactly one of: ["Analytical & Investigative", "Artistic & Creative", "Social & Helping", "Enterprising & Leading", "Conventional & Organizing", "Realistic & Hands-On"].
+{{ choice_list }}
+    Respond with a valid JSON object with a single key "tags": a list with one tag per option, in order.
+    """)
+
+def render_retag_prompt(question, choice_texts):
+    choice_list = "\n".join(f"    {i + 1}. {text}" for i, text in enumerate(choice_texts))
+    return _RETAG.render(question=question, choice_list=choice_list)
@@ -0,0 +1,100 @@
+# question_selector.py
+
+import json
+import os
+import threading
+
+import numpy as np
+
+# Below this expected information gain (in nats) no stored question can still separate
+# the user's leading tags, and the next question comes from the LLM instead.
+SELECTOR_MIN_GAIN = float(os.getenv("SELECTOR_MIN_GAIN", "0.05"))
+# Pseudo-count added to each leading tag, so an empty tally is a uniform belief.
+SELECTOR_PRIOR = float(os.getenv("SELECTOR_PRIOR", "1.0"))
+# Chance that a user answers off their leading tag (picks any choice at random).
+SELECTOR_NOISE = float(os.getenv("SELECTOR_NOISE", "0.1"))
+# Questions are scored on how well they separate this many leading tags (ties included).
+SELECTOR_TOP_TAGS = int(os.getenv("SELECTOR_TOP_TAGS", "2"))
+
+class QuestionBank:
+    # The stored questions of one quiz as a question x choice x tag likelihood tensor:
+    #   likelihood[q, c, t] = P(user picks choice c of question q | their leading tag is t)
+    # Scoring every question against a belief is then a handful of array operations.
+
+    def __init__(self, etag, questions):
+        self.etag = etag
+        self.questions = [question for question in questions if question["choices"]]
+        self.positions = {question["id"]: i for i, question in enumerate(self.questions)}
+        tags = sorted({
+            tag["name"]
+            for question in self.questions
+            for choice in question["choices"]
+            for tag in choice["interest_tags"]
+        })
+        self.tag_index = {name: column for column, name in enumerate(tags)}
+        max_choices = max((len(question["choices"]) for question in self.questions), default=0)
+        self.likelihood = np.zeros((len(self.questions), max_choices, len(tags)))
+        for row, question in enumerate(self.questions):
+            n = len(question["choices"])
+            hits = np.zeros((n, len(tags)))
+            for c, choice in enumerate(question["choices"]):
+                for tag in choice["interest_tags"]:
+                    hits[c, self.tag_index[tag["name"]]] = 1.0
+            covered = hits.sum(axis=0)
+            # A tag no choice offers gives no preference: the user picks uniformly.
+            matched = np.where(covered > 0, hits / np.where(covered == 0, 1.0, covered), 1.0 / n)
+            self.likelihood[row, :n] = (1.0 - SELECTOR_NOISE) * matched + SELECTOR_NOISE / n
+
+    def belief(self, tag_tally):
+        # Distribution over the user's leading tag, restricted to the top tags of the tally.
+        counts = np.zeros(len(self.tag_index))
+        for tag, count in (tag_tally or {}).items():
+            column = self.tag_index.get(tag)
+            if column is not None:
+                counts[column] += count
+        cutoff = np.sort(counts)[-min(SELECTOR_TOP_TAGS, len(counts))]
+        belief = np.where(counts >= cutoff, counts + SELECTOR_PRIOR, 0.0)
+        return belief / belief.sum()
+
+    def expected_gain(self, belief):
+        # Mutual information between the leading tag and the answer, for every question.
+        joint = self.likelihood * belief
+        answer = joint.sum(axis=2, keepdims=True)
+        ratio = np.divide(joint, answer * belief, out=np.ones_like(joint), where=joint > 0)
+        return (joint * np.log(ratio)).sum(axis=(1, 2))
+
+    def select(self, asked_question_ids, tag_tally):
+        # Returns (question, gain); question is None once the bank stops being informative.
+        if not self.questions or not self.tag_index:
+            return None, 0.0
+        gains = self.expected_gain(self.belief(tag_tally))
+        for question_id in asked_question_ids:
+            position = self.positions.get(question_id)
+            if position is not None:
+                gains[position] = -np.inf
+        best = int(np.argmax(gains))
+        gain = float(gains[best])
+        if not np.isfinite(gain) or gain < SELECTOR_MIN_GAIN:
+            return None, max(gain, 0.0)
+        return self.questions[best], gain
+
+class QuestionSelector:
+    # One bank per quiz, rebuilt whenever the quiz cache entry it came from changes.
+
+    def __init__(self):
+        self._banks = {}
+        self._lock = threading.Lock()
+
+    def bank(self, entry):
+        bank = self._banks.get(entry.quiz_id)
+        if bank is not None and bank.etag == entry.etag:
+            return bank
+        with self._lock:
+            bank = self._banks.get(entry.quiz_id)
+            if bank is None or bank.etag != entry.etag:
+                questions = json.loads(entry.variants["identity"])["questions"]
+                bank = QuestionBank(entry.etag, questions)
+                self._banks[entry.quiz_id] = bank
+        return bank
+
+question_selector = QuestionSelector()
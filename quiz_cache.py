@@ -0,0 +1,123 @@
+# quiz_cache.py
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+from fastapi import Response
+
+import models, schemas
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+QUIZ_CACHE_MAX_AGE = int(os.getenv("QUIZ_CACHE_MAX_AGE", "300"))
+QUIZ_CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("QUIZ_CACHE_STALE_WHILE_REVALIDATE", "600"))
+# How long a cached quiz is served before we re-check the content version in the database.
+QUIZ_CACHE_REVALIDATE_SECONDS = float(os.getenv("QUIZ_CACHE_REVALIDATE_SECONDS", "5"))
+
+# --- CONTENT VERSION ---
+# A single row that seed.py and the seed endpoint bump whenever they rewrite quiz content,
+# so every worker notices the change even though the cache lives in-process.
+
+def get_content_version(db):
+    row = db.get(models.ContentVersion, 1)
+    return row.version if row else 0
+
+def bump_content_version(db):
+    row = db.get(models.ContentVersion, 1)
+    if row is None:
+        db.add(models.ContentVersion(id=1, version=1))
+    else:
+        row.version += 1
+
+# --- CACHE ---
+
+class CachedQuiz:
+    def __init__(self, quiz_id, version, body):
+        self.quiz_id = quiz_id
+        self.version = version
+        # Weak validator: the same ETag covers the identity and pre-compressed variants.
+        self.etag = f'W/"q{quiz_id}-v{version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+        self.variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(body, quality=11)
+        self.checked_at = time.monotonic()
+
+class QuizCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, db, quiz_id, loader):
+        entry = self._entries.get(quiz_id)
+        if entry and time.monotonic() - entry.checked_at < QUIZ_CACHE_REVALIDATE_SECONDS:
+            return entry
+        with self._lock:
+            entry = self._entries.get(quiz_id)
+            version = get_content_version(db)
+            if entry and entry.version == version:
+                entry.checked_at = time.monotonic()
+                return entry
+            quiz = loader(db, quiz_id)
+            if quiz is None:
+                self._entries.pop(quiz_id, None)
+                return None
+            body = schemas.Quiz.model_validate(quiz).model_dump_json().encode("utf-8")
+            entry = CachedQuiz(quiz_id, version, body)
+            self._entries[quiz_id] = entry
+            return entry
+
+    def invalidate(self, quiz_id=None):
+        with self._lock:
+            if quiz_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(quiz_id, None)
+
+quiz_cache = QuizCache()
+
+# --- HTTP ---
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag.removeprefix("W/"):
+            return True
+    return False
+
+def _pick_encoding(accept_encoding, variants):
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in variants and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+def build_response(entry, if_none_match=None, accept_encoding=None):
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"public, max-age={QUIZ_CACHE_MAX_AGE}, stale-while-revalidate={QUIZ_CACHE_STALE_WHILE_REVALIDATE}",
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = _pick_encoding(accept_encoding, entry.variants)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=entry.variants[encoding], media_type="application/json", headers=headers)
@@ -1,7 +1,9 @@
 # schemas.py
 
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal
+
+from conversation import ALLOWED_TAGS
 
 class InterestTag(BaseModel):
     name: str
@@ -41,4 +43,42 @@ class Career(BaseModel):
 class ConversationalInput(BaseModel):
     conversation_history: List[dict]
     user_age: str
-    hobbies: List[str]
\ No newline at end of file
+    hobbies: List[str]
+
+class SpeculationInput(ConversationalInput):
+    question: str
+    choices: List[dict]
+
+class SessionCreate(BaseModel):
+    user_age: str
+    hobbies: List[str] = []
+    total_questions: int = Field(default=5, ge=1, le=20)
+    quiz_id: int = 1
+
+class NextQuestionInput(BaseModel):
+    asked_question_ids: List[int] = []
+    tag_tally: Dict[str, int] = {}
+
+class SessionAnswer(BaseModel):
+    choice_index: int
+
+# --- LLM OUTPUT ---
+# What the model has to return. Every response is validated against these (see
+# llm_output.py), and for Gemini models they double as the JSON-mode response schema.
+
+InterestTagName = Literal[tuple(ALLOWED_TAGS)]
+
+class GeneratedChoice(BaseModel):
+    text: str = Field(min_length=1)
+    tag: InterestTagName
+
+class GeneratedQuestion(BaseModel):
+    question: str = Field(min_length=1)
+    choices: List[GeneratedChoice] = Field(min_length=2, max_length=6)
+
+class GeneratedRecommendation(BaseModel):
+    career: str = Field(min_length=1)
+    reason: str = Field(min_length=1)
+
+class GeneratedRecommendations(BaseModel):
+    recommendations: List[GeneratedRecommendation] = Field(min_length=1, max_length=8)
@@ -0,0 +1,84 @@
+# serve.py
+#
+# Production entry point (see Procfile):
+#
+#   python serve.py
+#
+# Runs WEB_CONCURRENCY uvicorn workers (default 2). The supervisor does not import the
+# app; each worker imports main.py and then builds its own LLM router and warms its own
+# connection pool and caches (main.lifespan) before taking traffic.
+# Run `python migrate.py` first, or set AUTO_MIGRATE=1 to migrate here once before the
+# workers start.
+#
+# Size WEB_CONCURRENCY from the container's CPU quota, not the host's cores, and keep
+# WEB_CONCURRENCY x (DB_POOL_SIZE + DB_MAX_OVERFLOW) under the database's connection
+# limit (Supabase's is small); with more workers, lower the pool or use DB_PGBOUNCER.
+#
+# With more than one worker, state that must outlive a request is shared through the
+# database: sessions (SESSION_STORE=database), generated questions including prefetched
+# ones (LLM_CACHE_PERSISTENT=1) and batch job claims. A prefetch still in flight on one
+# worker is not visible to the others, so with sticky routing by session more of them
+# pay off. Metrics are merged across workers through METRICS_DIR (see metrics.py);
+# the JSON stats endpoints still describe the one worker that answered.
+
+import glob
+import os
+import tempfile
+import time
+
+STARTED = time.perf_counter()
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import uvicorn
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "10000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "2"))
+KEEP_ALIVE_SECONDS = int(os.getenv("KEEP_ALIVE_SECONDS", "75"))
+LOG_LEVEL = os.getenv("UVICORN_LOG_LEVEL", "info")
+
+def main():
+    if not os.getenv("DATABASE_URL"):
+        # Falling back to ./zhero.db here would put production data on the instance's
+        # ephemeral disk. Use DATABASE_URL=sqlite:///./zhero.db to mean it.
+        raise SystemExit("DATABASE_URL is not set; refusing to start on the default SQLite file.")
+    if os.getenv("AUTO_MIGRATE") == "1":
+        from migrate import migrate
+        print(f"Migrated in {migrate():.2f}s.")
+    # Migrated (or deliberately not) once here; the workers must not race on it.
+    os.environ["AUTO_MIGRATE"] = "0"
+    if WEB_CONCURRENCY > 1 and os.getenv("SESSION_STORE", "memory") == "memory":
+        # An in-memory session would only exist in the worker that created it.
+        os.environ["SESSION_STORE"] = "database"
+        print("SESSION_STORE=memory does not work across workers; using the database store.")
+    if WEB_CONCURRENCY > 1:
+        # One file per worker; files left over from an earlier run would count twice.
+        metrics_dir = os.environ.get("METRICS_DIR") or tempfile.mkdtemp(prefix="zhero-metrics-")
+        os.environ["METRICS_DIR"] = metrics_dir
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+            os.remove(path)
+    if WEB_CONCURRENCY > 1 and "LLM_CACHE_PERSISTENT" not in os.environ:
+        # Lets a question prefetched by one worker be served by another.
+        os.environ["LLM_CACHE_PERSISTENT"] = "1"
+    connections = WEB_CONCURRENCY * (int(os.getenv("DB_POOL_SIZE", "5")) + int(os.getenv("DB_MAX_OVERFLOW", "10")))
+    if os.getenv("DB_PGBOUNCER") != "1":
+        print(f"Up to {connections} database connections ({WEB_CONCURRENCY} workers x pool + overflow).")
+    print(f"Starting {WEB_CONCURRENCY} worker(s) on {HOST}:{PORT} ({time.perf_counter() - STARTED:.2f}s after launch).")
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        # Render and similar hosts terminate TLS in front of us.
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        timeout_keep_alive=KEEP_ALIVE_SECONDS,
+        log_level=LOG_LEVEL,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# sessions.py
+
+import datetime
+import json
+import os
+import time
+import uuid
+
+from cachetools import TTLCache
+from sqlalchemy import delete
+
+import models
+from conversation import answer_turn, turn_tag
+from database import SessionLocal
+
+# memory | database | redis
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(6 * 3600)))
+SESSION_MAX_IN_MEMORY = int(os.getenv("SESSION_MAX_IN_MEMORY", "100000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# The database store deletes expired sessions at most this often, from whichever worker
+# writes a session next.
+SESSION_PRUNE_INTERVAL_SECONDS = float(os.getenv("SESSION_PRUNE_INTERVAL_SECONDS", "600"))
+
+# --- STORES ---
+# Every store keeps a session as one JSON document under its id, so any
+# key/value backend with expiry (Redis or compatible) can be dropped in.
+
+class InMemorySessionStore:
+    def __init__(self):
+        self._data = TTLCache(maxsize=SESSION_MAX_IN_MEMORY, ttl=SESSION_TTL_SECONDS)
+
+    def get(self, session_id):
+        raw = self._data.get(session_id)
+        return json.loads(raw) if raw is not None else None
+
+    def put(self, session_id, state):
+        self._data[session_id] = json.dumps(state)
+
+class DatabaseSessionStore:
+    def __init__(self):
+        self._last_prune = time.monotonic()
+
+    def get(self, session_id):
+        db = SessionLocal()
+        try:
+            row = db.get(models.QuizSession, session_id)
+            if row is None:
+                return None
+            if (datetime.datetime.utcnow() - row.updated_at).total_seconds() > SESSION_TTL_SECONDS:
+                return None
+            return json.loads(row.data)
+        finally:
+            db.close()
+
+    def put(self, session_id, state):
+        db = SessionLocal()
+        try:
+            db.merge(models.QuizSession(id=session_id, data=json.dumps(state), updated_at=datetime.datetime.utcnow()))
+            db.commit()
+        finally:
+            db.close()
+        if time.monotonic() - self._last_prune >= SESSION_PRUNE_INTERVAL_SECONDS:
+            self._last_prune = time.monotonic()
+            self.prune()
+
+    def prune(self):
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=SESSION_TTL_SECONDS)
+        db = SessionLocal()
+        try:
+            deleted = db.execute(delete(models.QuizSession).where(models.QuizSession.updated_at < cutoff)).rowcount
+            db.commit()
+        finally:
+            db.close()
+        return deleted
+
+class RedisSessionStore:
+    def __init__(self):
+        import redis
+        self._redis = redis.Redis.from_url(REDIS_URL)
+
+    def get(self, session_id):
+        raw = self._redis.get(f"zhero:session:{session_id}")
+        return json.loads(raw) if raw is not None else None
+
+    def put(self, session_id, state):
+        self._redis.set(f"zhero:session:{session_id}", json.dumps(state), ex=SESSION_TTL_SECONDS)
+
+def create_store(kind=SESSION_STORE):
+    if kind == "database":
+        return DatabaseSessionStore()
+    if kind == "redis":
+        return RedisSessionStore()
+    return InMemorySessionStore()
+
+session_store = create_store()
+
+# --- STATE ---
+
+def new_session(user_age, hobbies, total_questions, quiz_id):
+    return {
+        "id": uuid.uuid4().hex,
+        "user_age": user_age,
+        "hobbies": hobbies,
+        "total_questions": total_questions,
+        # Stored questions are picked adaptively from this quiz's bank until it runs dry.
+        "quiz_id": quiz_id,
+        "asked_question_ids": [],
+        "bank_exhausted": False,
+        "question_number": 1,
+        "current_question": None,
+        "history": [],
+        "tag_tally": {},
+        # The rendered transcript, appended to once per turn instead of rebuilt.
+        "history_text": "",
+        "recommendations": None,
+    }
+
+def question_text(question):
+    return question.get("question", question.get("text", ""))
+
+def record_answer(state, choice_index):
+    question = state["current_question"]
+    turn = answer_turn(question_text(question), question["choices"][choice_index])
+    state["history"].append(turn)
+    if question.get("id") is not None:
+        state["asked_question_ids"].append(question["id"])
+    tag = turn_tag(turn)
+    if tag:
+        state["tag_tally"][tag] = state["tag_tally"].get(tag, 0) + 1
+    separator = "\n" if state["history_text"] else ""
+    state["history_text"] += f"{separator}Q: {turn['question']}\nA: {turn['answer']}"
+    return turn
+
+def is_complete(state):
+    return len(state["history"]) >= state["total_questions"]
+
+def public_view(state):
+    return {
+        "session_id": state["id"],
+        "question_number": state["question_number"],
+        "total_questions": state["total_questions"],
+        "complete": is_complete(state),
+        "question": None if is_complete(state) else state["current_question"],
+        "tag_tally": state["tag_tally"],
+    }
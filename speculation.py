@@ -0,0 +1,108 @@
+# speculation.py
+
+import asyncio
+import os
+import time
+
+from conversation import tag_tally, choice_tag
+from llm_cache import llm_cache
+
+# Opt-in: each speculated branch is a real LLM call whether or not the user picks it.
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "0") == "1"
+# On by default: lets the frontend ask for the same branches for its current question
+# (POST /sessions/{id}/prefetch). Costs the same calls, but only for LLM turns of
+# sessions that ask, and only while an LLM slot is free. Set to 0 to refuse them all.
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+# How many branches (distinct answer tags) to pre-generate per question.
+SPECULATION_BUDGET = int(os.getenv("SPECULATION_BUDGET", "2"))
+SPECULATION_TTL_SECONDS = float(os.getenv("SPECULATION_TTL_SECONDS", "120"))
+
+class Branch:
+    def __init__(self, parent, task):
+        self.parent = parent
+        self.task = task
+        self.created_at = time.monotonic()
+
+def _retrieve(task):
+    # Unused branches may fail or be cancelled; don't let asyncio log them as unhandled.
+    if not task.cancelled():
+        task.exception()
+
+def likely_choices(history, choices, budget=SPECULATION_BUDGET):
+    # Rank the answer choices by the running tally of their tag; ties keep the
+    # original choice order. Returns at most `budget` choices with distinct tags.
+    tally = tag_tally(history)
+    ranked = sorted(enumerate(choices), key=lambda pair: (-tally.get(choice_tag(pair[1]), 0), pair[0]))
+    picked, seen = [], set()
+    for _, choice in ranked:
+        tag = choice_tag(choice)
+        if tag is None or tag in seen:
+            continue
+        seen.add(tag)
+        picked.append(choice)
+        if len(picked) >= budget:
+            break
+    return picked
+
+class Speculator:
+    def __init__(self):
+        self._branches = {}
+        self.stats = {"launched": 0, "hits": 0, "misses": 0, "cancelled": 0, "expired": 0}
+
+    def launch(self, parent, key, coro):
+        self.expire()
+        if key in self._branches:
+            coro.close()
+            return False
+        task = asyncio.create_task(coro)
+        task.add_done_callback(_retrieve)
+        self._branches[key] = Branch(parent, task)
+        self.stats["launched"] += 1
+        return True
+
+    async def take(self, key):
+        self.expire()
+        branch = self._branches.pop(key, None)
+        if branch is None:
+            self.stats["misses"] += 1
+            return None
+        # The user has answered, so the other branches of the same question are dead.
+        for other_key, other in list(self._branches.items()):
+            if other.parent == branch.parent:
+                self._discard(other_key, "cancelled")
+        try:
+            value = await branch.task
+        except (Exception, asyncio.CancelledError):
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return value
+
+    def expire(self):
+        now = time.monotonic()
+        for key, branch in list(self._branches.items()):
+            if now - branch.created_at > SPECULATION_TTL_SECONDS:
+                self._discard(key, "expired")
+
+    def _discard(self, key, reason):
+        branch = self._branches.pop(key)
+        # A real request for the same question may be coalesced onto this branch's
+        # call; then it is left to finish (and fill the cache) instead of cancelled.
+        if not branch.task.done() and not llm_cache.is_awaited(key):
+            branch.task.cancel()
+        self.stats[reason] += 1
+
+    def snapshot(self):
+        served = self.stats["hits"] + self.stats["misses"]
+        launched = self.stats["launched"]
+        return {
+            **self.stats,
+            "enabled": SPECULATION_ENABLED,
+            "prefetch_enabled": PREFETCH_ENABLED,
+            "budget": SPECULATION_BUDGET,
+            "pending": len(self._branches),
+            "hit_rate": self.stats["hits"] / served if served else 0.0,
+            "wasted_rate": (self.stats["cancelled"] + self.stats["expired"]) / launched if launched else 0.0,
+        }
+
+speculator = Speculator()
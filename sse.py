@@ -0,0 +1,22 @@
+# sse.py
+#
+# The server-sent events wire format, shared by the API (streaming.py) and its clients
+# (backend_client.py, loadtest.py). Kept free of server imports so the Streamlit app
+# doesn't pull in the LLM stack.
+
+import json
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def iter_sse(response):
+    # Yields (event, data) from a streamed requests.Response.
+    event, data = None, []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif not line and event:
+            yield event, json.loads("\n".join(data))
+            event, data = None, []
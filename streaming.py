@@ -0,0 +1,202 @@
+# streaming.py
+
+import json
+import traceback
+
+from llm import LLMTimeoutError, LLMOverloadedError
+from llm_output import LLMOutputError
+from sse import format_sse
+
+# --- INCREMENTAL JSON ---
+
+class IncrementalJSONParser:
+    # Scans a JSON object as it streams in and reports values the moment they are complete:
+    #   ("item", key, value)   for each element of an array stored under a root key
+    #   ("member", key, value) for each root key once its whole value has arrived
+    # Anything before the root "{" (prose, a ```json fence) is skipped.
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack = []
+        self._starts = []
+        self._token_start = None
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key = None
+        self._root = None
+
+    @property
+    def finished(self):
+        return self._root is not None
+
+    def feed(self, chunk):
+        self._text += chunk
+        events = []
+        while self._pos < len(self._text) and self._root is None:
+            i = self._pos
+            c = self._text[i]
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._end_token(i + 1, events)
+                continue
+            if self._token_start is not None and (c in ",:]}" or c.isspace()):
+                self._end_token(i, events)
+            if not self._stack:
+                if c == "{":
+                    self._open(c, i)
+                continue
+            if c == '"':
+                self._in_string = True
+                self._token_start = i
+            elif c in "{[":
+                self._open(c, i)
+            elif c in "}]":
+                self._close(i, events)
+            elif c == ",":
+                if len(self._stack) == 1:
+                    self._expect_key = True
+            elif c != ":" and not c.isspace() and self._token_start is None:
+                self._token_start = i
+        return events
+
+    def document(self):
+        if self._root is None:
+            raise ValueError("Incomplete JSON document in model output")
+        return json.loads(self._text[self._root[0]:self._root[1]])
+
+    def _open(self, c, i):
+        self._stack.append(c)
+        self._starts.append(i)
+        if len(self._stack) == 1:
+            self._expect_key = True
+
+    def _close(self, i, events):
+        self._stack.pop()
+        start = self._starts.pop()
+        if not self._stack:
+            self._root = (start, i + 1)
+            return
+        self._complete(start, i + 1, events)
+
+    def _end_token(self, end, events):
+        start = self._token_start
+        self._token_start = None
+        if len(self._stack) == 1 and self._expect_key:
+            self._key = json.loads(self._text[start:end])
+            self._expect_key = False
+            return
+        self._complete(start, end, events)
+
+    def _complete(self, start, end, events):
+        depth = len(self._stack)
+        if depth == 1:
+            events.append(("member", self._key, json.loads(self._text[start:end])))
+        elif depth == 2 and self._stack[1] == "[":
+            events.append(("item", self._key, json.loads(self._text[start:end])))
+
+# --- SERVER-SENT EVENTS ---
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def replay_sse(document, item_events, member_events=None):
+    # Emits the same event sequence for an already-complete document, e.g. a cache hit.
+    member_events = member_events or {}
+    for key, value in document.items():
+        if key in member_events:
+            yield format_sse(member_events[key], value)
+        if key in item_events and isinstance(value, list):
+            for item in value:
+                yield format_sse(item_events[key], item)
+    yield format_sse("done", document)
+
+def _owed(merge, document, item_events):
+    for key, name in item_events.items():
+        for item in merge.rest(key, document):
+            yield format_sse(name, item)
+
+async def sse_from_json_stream(chunks, item_events, member_events=None, on_done=None, fallback=None, repair_item=None, finish=None, merge=None):
+    # `fallback` is an async callable producing a complete document; it is used when the
+    # model times out, returns unusable output or is shed before any event has been sent.
+    # `repair_item` fixes or drops (returns None) each item before it is sent, and
+    # `finish` turns the full response text into the validated final document.
+    # `merge` sends something other than the model's items: merge.item(key, value) returns
+    # the items to send now and merge.rest(key, document) those the final (or fallback)
+    # document still owes. Since whatever was sent is part of the fallback too, the
+    # fallback is then used even after items have gone out.
+    member_events = member_events or {}
+    parser = IncrementalJSONParser()
+    text = []
+    emitted = False
+    parsing = True
+    try:
+        async for chunk in chunks:
+            text.append(chunk)
+            if not parsing:
+                continue
+            try:
+                events = parser.feed(chunk)
+            except ValueError:
+                # Braces in prose ("Here is {your} answer: {...}") aren't JSON. Stop sending
+                # events and leave the whole text to `finish` or the fallback.
+                parsing = False
+                continue
+            for kind, key, value in events:
+                if kind == "item" and key in item_events:
+                    if repair_item is not None:
+                        value = repair_item(value)
+                        if value is None:
+                            continue
+                    for item in merge.item(key, value) if merge is not None else [value]:
+                        emitted = True
+                        yield format_sse(item_events[key], item)
+                elif kind == "member" and key in member_events:
+                    emitted = True
+                    yield format_sse(member_events[key], value)
+        if finish is not None:
+            document = await finish("".join(text))
+        elif not parsing:
+            raise LLMOutputError("The model's output is not valid JSON")
+        else:
+            try:
+                document = parser.document()
+            except ValueError as e:
+                raise LLMOutputError(str(e)) from e
+        if on_done is not None:
+            await on_done(document)
+        if not parsing and not emitted:
+            # Nothing was streamed before the parser gave up; send the items now.
+            for event in replay_sse(document, item_events, member_events):
+                yield event
+            return
+        if merge is not None:
+            for event in _owed(merge, document, item_events):
+                yield event
+        yield format_sse("done", document)
+    except (LLMTimeoutError, LLMOutputError, LLMOverloadedError) as e:
+        document = await fallback() if fallback is not None and (merge is not None or not emitted) else None
+        if not document:
+            if isinstance(e, LLMOverloadedError):
+                yield format_sse("error", {"status_code": 503, "detail": str(e), "retry_after": e.retry_after})
+            else:
+                yield format_sse("error", {"status_code": 504 if isinstance(e, LLMTimeoutError) else 502, "detail": str(e)})
+            return
+        if on_done is not None:
+            await on_done(document)
+        if emitted:
+            for event in _owed(merge, document, item_events):
+                yield event
+            yield format_sse("done", document)
+            return
+        for event in replay_sse(document, item_events, member_events):
+            yield event
+    except Exception as e:
+        traceback.print_exc()
+        yield format_sse("error", {"status_code": 500, "detail": f"An exception occurred: {repr(e)}"})
@@ -0,0 +1,27 @@
+# test_llm_cache.py
+
+import asyncio
+
+from llm_cache import LLMCache
+
+def test_cancelled_leader_hands_over_to_a_waiter():
+    cache = LLMCache(persistent=False)
+    calls = 0
+
+    async def generate():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def run():
+        leader = asyncio.create_task(cache.get_or_generate("key", "question", generate))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(cache.get_or_generate("key", "question", generate)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        # e.g. a speculative branch discarded while real requests wait on its call
+        leader.cancel()
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(run()) == [2, 2, 2]
+    assert calls == 2
@@ -0,0 +1,42 @@
+# test_llm_router.py
+
+import asyncio
+import time
+
+import llm_output
+from fake_llm import FakeGenerativeModel
+from llm_output import generation_kwargs, parse_recommendations
+from llm_router import Route
+
+def fake_model(name):
+    model = FakeGenerativeModel(name)
+    model._latency = lambda: 0.0
+    return model
+
+def test_generation_kwargs_without_schema():
+    assert generation_kwargs("gemini-2.5-flash", None) == {"generation_config": {"response_mime_type": "application/json"}}
+
+def test_reasks_through_gemini_route_keep_breaker_closed(monkeypatch):
+    monkeypatch.setattr(llm_output, "LLM_JSON_MODE", "auto")
+    route = Route("recommendations", [fake_model("gemini-2.5-flash"), fake_model("gemma-3n-e4b-it")], 10.0, 25.0)
+
+    async def reask_many():
+        # Unparseable text makes every call re-ask through route.generate with model_cls=None.
+        return [await parse_recommendations("Sorry, no JSON here.", route.generate) for _ in range(6)]
+
+    documents = asyncio.run(reask_many())
+    assert all(document["recommendations"] for document in documents)
+    primary = route.snapshot()["models"][0]
+    assert primary["state"] == "closed"
+    assert primary["calls"] == 6 and primary["error_rate"] == 0
+
+def test_slow_primary_leaves_budget_for_fallback():
+    slow = fake_model("gemma-3n-e4b-it")
+    slow._latency = lambda: 5.0
+    route = Route("question", [slow, fake_model("gemini-2.0-flash-lite")], 2.0, 0.3)
+
+    started = time.monotonic()
+    text = asyncio.run(route.generate("Next question, please."))
+    assert text
+    assert time.monotonic() - started < 1.5
+    assert route.snapshot()["models"][0]["error_rate"] == 1.0
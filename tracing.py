@@ -0,0 +1,88 @@
+# tracing.py
+
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+
+# Spans follow the OpenTelemetry shape (trace_id / span_id / parent_span_id, attributes,
+# status) and are written one JSON object per line to TRACE_FILE. Unset = tracing off,
+# and span() costs next to nothing.
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+_current = contextvars.ContextVar("current_span", default=None)
+_file_lock = threading.Lock()
+_file = None
+
+def _export(record):
+    global _file
+    line = json.dumps(record, default=str) + "\n"
+    with _file_lock:
+        if _file is None:
+            _file = open(TRACE_FILE, "a", encoding="utf-8", buffering=1)
+        _file.write(line)
+
+class Span:
+    def __init__(self, name, attributes):
+        parent = _current.get()
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.status = "OK"
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._start = time.time_ns()
+        self._started = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Closed from another context, e.g. a streaming generator finished by the server.
+            pass
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.status = "ERROR"
+            self.attributes.setdefault("error", repr(exc))
+        _export({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self._start,
+            "duration_ms": round(duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        })
+        return False
+
+class _NoopSpan:
+    trace_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP = _NoopSpan()
+
+def span(name, **attributes):
+    # Usage: `with span("llm.generate", prompt_chars=n) as s: ...; s.set(...)`.
+    # Works in sync and async code; children started inside nest under it.
+    if not TRACE_FILE:
+        return _NOOP
+    return Span(name, attributes)